@@ -1,68 +1,167 @@
+from copy import copy
+
 import arcade
 from settings import *
 from sounds import *
+import profiler
+from clock import CLOCK
+from ecs import Brain, Chase, Patrol, Trigger
+from textures import HIT_BOXES, load_animation, load_texture
+from video import VideoStream
 
 
 class Animation:
+    """
+    Playhead over a shared list of frames, driven by the global clock (clock.py).
+
+    While the animation is the entity's current one its position is CLOCK.tick - started;
+    when the entity switches to another animation the position is kept in index (pause).
+    """
+
     def __init__(self, filepath, length, speed=5, reverse=False, stagger=False, stop=False, name=None, upscale=1):
         self.index = 0
+        # Тик часов, на котором позиция была 0; None - позиция в index, отсчёт начнётся при следующем update
+        self.started = None
+        # Тик, на котором сменится кадр (или анимация закончится)
+        self.next_change = 0
         self.speed = speed
         self.length = length
+        self.ticks = length * speed
         self.stagger = stagger
         self.stop = stop
         self.filepath = filepath
         self.name = name
 
-        texture_pairs = []
-        for i in range(1, length + 1):
-            texture = arcade.load_texture(filepath.format(i))
-            texture.size = (texture.size[0]*upscale, texture.size[1]*upscale)
-
-            if reverse:
-                texture_pairs.append(
-                    (texture.flip_left_right(), texture)
-                )
-            else:
-                texture_pairs.append(
-                    (texture, texture.flip_left_right())
-                )
-
-        self.textures = texture_pairs
+        # Кадры берутся из общего кэша, Animation хранит только свой индекс
+        self.textures = load_animation(filepath, length, reverse, upscale)
+        # Кадр для каждой позиции - вместо деления на каждом шаге
+        self.table = [self.textures[index // speed] for index in range(self.ticks)]
+
+    def update(self, tick):
+        """Frame pair at clock tick; None when a stop animation has just ended."""
+        started = self.started
+        if started is None:
+            index = self.index + 1
+            started = self.started = tick - index
+        else:
+            index = tick - started
 
-    def update(self):
-        self.index += 1
-        if self.index >= self.length * self.speed:
-            self.index = 0
+        if index >= self.ticks:
+            # Остаток - для сущностей, которые обновлялись не каждый тик
+            index %= self.ticks
+            started = self.started = tick - index
             if self.stop:
+                self.index = 0
+                self.started = None
+                self.next_change = tick + 1
                 return None
 
-        frame = self.index // self.speed
+        self.next_change = started + (index // self.speed + 1) * self.speed
+        return self.table[index]
+
+    def pause(self, tick):
+        """The entity switched to another animation; tick is the last tick this one was shown at."""
+        if self.started is not None:
+            self.index = tick - self.started
+            self.started = None
 
-        return self.textures[frame]
+    def resume(self):
+        self.started = None
 
     def __getitem__(self, key):
         return self.textures[self.index]
 
+    def frame(self, number):
+        return self.textures[number]
+
     def __call__(self):
         self.index = 0
+        self.started = None
 
 
 class BaseEntity(arcade.Sprite):
+    # Атрибуты, которые запоминаются после загрузки уровня и возвращаются при reset
+    SNAPSHOT = ('position', 'change_x', 'change_y', 'alive', 'character_face_direction')
+    # Компоненты сущности (ecs.py), их поля тоже запоминаются для reset
+    COMPONENTS = ()
+    # True - хитбокс меняется вместе с кадром анимации, иначе остаётся от первой текстуры
+    ANIMATED_HIT_BOX = False
+    ANIMATIONS = {}
+
     def __init__(self):
+        self.sensors = []
+        self._now_texture = None
+        # Тик, за который анимация уже обновлена, и тик следующей смены кадра;
+        # animation_dirty - анимация или направление сменились, кадр нужно выбрать заново
+        self.animated_tick = -1
+        self.next_frame_tick = 0
+        self.animation_dirty = True
         self.init_anims()
-        super().__init__(scale=0.4)
+        super().__init__(scale=ENTITY_SCALING)
         self.now_texture = self.idle_texture
         self.alive = True
         self.character_face_direction = 0
 
 
+    @property
+    def now_texture(self):
+        return self._now_texture
+
+    @now_texture.setter
+    def now_texture(self, anim):
+        current = self._now_texture
+        if anim is current:
+            return
+        if current is not None:
+            # Прежняя анимация останавливается на кадре, показанном последним
+            tick = CLOCK.tick
+            current.pause(tick if self.animated_tick == tick else tick - 1)
+        anim.resume()
+        self._now_texture = anim
+        self.animation_dirty = True
+
     def change_anim(self):
         # OVERRIDE
         pass
 
+    def add_sensor(self, offset_x, offset_y, width, height):
+        sensor = Sensor(self, offset_x, offset_y, width, height)
+        self.sensors.append(sensor)
+        return sensor
+
     def init_anims(self):
-        # OVERRIDE
-        pass
+        # Анимации описаны в ANIMATIONS: имя атрибута -> аргументы Animation
+        for attr, spec in self.ANIMATIONS.items():
+            setattr(self, attr, Animation(**spec))
+
+    def save_state(self):
+        """Remember the current state so restore_state can bring it back."""
+        state = {name: copy(getattr(self, name)) for name in self.SNAPSHOT}
+        state['components'] = [getattr(self, name).save() for name in self.COMPONENTS]
+        state['sprite_lists'] = list(self.sprite_lists)
+        return state
+
+    def restore_state(self, state):
+        """Reset the entity in place to a state from save_state."""
+        for name in self.SNAPSHOT:
+            setattr(self, name, copy(state[name]))
+        # Компоненты восстанавливаются на месте: на них ссылаются списки систем
+        for name, component_state in zip(self.COMPONENTS, state['components']):
+            getattr(self, name).restore(component_state)
+
+        # Убитые мобы удаляются из всех списков спрайтов - возвращаем их обратно
+        for sprite_list in state['sprite_lists']:
+            if sprite_list not in self.sprite_lists:
+                sprite_list.append(self)
+
+        for anim in vars(self).values():
+            if isinstance(anim, (Animation, VideoStream)):
+                anim()
+        self.now_texture = self.idle_texture
+        self.texture = self.now_texture.frame(0)[self.character_face_direction]
+        self.animation_dirty = True
+        if self.ANIMATED_HIT_BOX:
+            self.set_hit_box(self.texture)
 
     def kill(self):
         if self.alive:
@@ -74,6 +173,7 @@ class BaseEntity(arcade.Sprite):
     def update(self, *args, **kwargs):
         self.update_animation()
 
+    @profiler.timed('animation')
     def update_animation(self):
         # Figure out if we need to flip face left or right
 
@@ -84,28 +184,96 @@ class BaseEntity(arcade.Sprite):
 
         self.change_anim()
 
-        direction = self.character_face_direction
-        anim = self.now_texture.update()
+        return self.advance_animation(CLOCK.tick)
+
+    def advance_animation(self, tick):
+        """Show the frame of the current animation at tick; returns the name of an animation that ended."""
+        anim = self.now_texture.update(tick)
 
         if anim is None:
-            name = self.now_texture.name
+            ended = self.now_texture
+            name = ended.name
             self.now_texture = self.idle_texture
-            anim = self.now_texture.update()
+            # Ролик Video сам себе idle: повторный update запустил бы декодер заново, кадр остаётся прежним
+            if self.now_texture is not ended:
+                anim = self.now_texture.update(tick)
         else:
             name = None
 
-        self.texture = anim[direction]
+        texture = anim[self.character_face_direction] if anim is not None else self.texture
+        # Кадр не поменялся - текстуру и хитбокс не трогаем
+        if texture is not self.texture:
+            self.texture = texture
+            if self.ANIMATED_HIT_BOX:
+                self.set_hit_box(texture)
 
+        self.animated_tick = tick
+        self.next_frame_tick = self.now_texture.next_change
+        self.animation_dirty = False
         return name
 
+    def set_hit_box(self, texture):
+        """Switch to the hit box of a frame, with its points scaled when the frame was loaded (textures.HIT_BOXES)."""
+        # Объект хитбокса у сущности свой только ради позиции и её смещённых точек, сами точки общие
+        self.hit_box = arcade.hitbox.RotatableHitBox(HIT_BOXES[texture], position=self.position)
+
 
 class Attack(arcade.Sprite):
     def __init__(self,x, y, path='assets/sprites/missing.png'):
-        super().__init__(path, 0.4, x, y)
+        super().__init__(load_texture(path), 0.4, x, y)
+
+
+class Sensor:
+    """
+    Trigger area attached to an entity (for example a mob's field of view).
+
+    The area is an axis-aligned box shifted by offset_x in the direction the
+    owner faces. It follows the owner, so checking it costs a few comparisons
+    and no sprite allocations.
+    """
+    __slots__ = ('owner', 'offset_x', 'offset_y', 'half_width', 'half_height', 'direction')
+
+    def __init__(self, owner, offset_x, offset_y, width, height):
+        self.owner = owner
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        self.half_width = width / 2
+        self.half_height = height / 2
+        self.direction = 1
+
+    def lrbt(self):
+        x = self.owner.center_x + self.offset_x * self.direction
+        y = self.owner.center_y + self.offset_y
+        return (
+            x - self.half_width, x + self.half_width,
+            y - self.half_height, y + self.half_height,
+        )
+
+    def overlaps(self, sprite):
+        """AABB test against the sprite's hit box."""
+        left, right, bottom, top = self.lrbt()
+        return (
+            sprite.right > left and sprite.left < right
+            and sprite.top > bottom and sprite.bottom < top
+        )
+
+    def draw(self, color=(255, 0, 0), border_width=2):
+        arcade.draw_lrbt_rectangle_outline(*self.lrbt(), color, border_width)
 
 
 
 class Player(BaseEntity):
+    SNAPSHOT = BaseEntity.SNAPSHOT + ('is_jump', 'is_attack', 'direction')
+
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/Player/{}.png', length=1),
+        'walk_texture': dict(filepath='assets/sprites/Player/{}.png', length=8),
+        'jump_texture': dict(filepath='assets/sprites/Player/Jump/jump{}.png', length=6, speed=10, stagger=False, stop=True, name='jump'),
+        'attack_texture': dict(filepath='assets/sprites/Player/player_attack/player_attack{}.png', length=4, speed=10, stagger=True, stop=True, name='attack'),
+        'die_texture': dict(filepath='assets/sprites/Player/player_die/player_die{}.png', length=9, speed=5, stagger=True, stop=True, name='die'),
+        'died_texture': dict(filepath='assets/sprites/Player/player_die/player_die9.png', length=1, speed=5, stagger=True, stop=True, name='died'),
+    }
+
     def __init__(self):
         # Default to face-right
         self.character_face_direction = 0
@@ -122,13 +290,11 @@ class Player(BaseEntity):
         self.attack_range = 500
         self.attack_collision = None
 
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/Player/{}.png', 1)
-        self.walk_texture = Animation('assets/sprites/Player/{}.png', 8)
-        self.jump_texture = Animation('assets/sprites/Player/Jump/jump{}.png', 6, 10, stagger=False, stop=True, name='jump')
-        self.attack_texture = Animation('assets/sprites/Player/player_attack/player_attack{}.png', 4, 10, stagger=True, stop=True, name='attack')
-        self.die_texture = Animation('assets/sprites/Player/player_die/player_die{}.png', 9, 5, stagger=True, stop=True, name='die')
-        self.died_texture = Animation('assets/sprites/Player/player_die/player_die9.png', 1, 5, stagger=True, stop=True, name='died')
+    def restore_state(self, state):
+        if self.attack_collision:
+            self.attack_collision.kill()
+            self.attack_collision = None
+        super().restore_state(state)
 
     def update(self):
         if not self.now_texture.stagger and self.alive:
@@ -202,6 +368,15 @@ class MovingObject:
         self.start_coords = [sprite.center_x, sprite.center_y]
         self.physics = True
 
+    def save_state(self):
+        return (self.sprite.position, list(self.direction))
+
+    def restore_state(self, state):
+        self.sprite.position, direction = state
+        self.direction = list(direction)
+        self.sprite.change_x = 0
+        self.sprite.change_y = 0
+
     def update(self):
         if self.direction[1]:
             # Меняем направление, если вышли за пределы движения по Y
@@ -218,68 +393,45 @@ class MovingObject:
 
 
 class Mob2(BaseEntity):
+    """
+    Standing mob. Its state is in components (ecs.py): patrol - movement, brain - AI flags;
+    systems.py updates them every tick.
+    """
+    COMPONENTS = ('patrol', 'brain')
+
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/mob2/idle/mob2_s{}.png', length=4, speed=10),
+        'attack_texture': dict(filepath='assets/sprites/mob2/attack/mob2_a{}.png', length=5, stop=True, stagger=True),
+    }
+
     def __init__(self, x, y, speed, direction, range_):
-        # Default to face-right
-        self.speed = speed
-        self.direction = direction
-        self.range = range_
-        self.start_coords = [x, y]
-        self.is_attack = False
-        self.is_aggro = False
-        self.can_attack = False
+        self.patrol = Patrol(x, range_, speed, direction[0])
+        self.brain = Brain()
 
         # Adjust the collision box. Default includes too much empty space
         # side-to-side. Box is centered at sprite center, (0, 0)
         self.points = [[-22, -64], [22, -64], [22, 28], [-22, 28]]
 
-        self.direction = direction
         self.view_collision = None
         # Set up parent class
         super().__init__()
 
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/mob2/idle/mob2_s{}.png', 4, 10)
-        self.attack_texture = Animation('assets/sprites/mob2/attack/mob2_a{}.png', 5, stop=True, stagger=True)
-
-    def create_view_collision(self, direction):
-        self.view_collision = None
-
-    def update(self):
-        if not self.now_texture.stagger and self.alive:
-            if self.direction[0]:
-                if abs(self.center_x  - self.start_coords[0]) >= self.range:
-                    self.direction[0] *= -1
-
-                self.change_x = self.speed * self.direction[0]
-
-            self.center_x += self.change_x
-
-        self.create_view_collision(self.direction[0])
-        anim_name = self.update_animation()
-        if anim_name == 'attack':
-            self.is_attack = False
-        elif anim_name == 'die':
-            arcade.Sprite.kill(self)
-        elif anim_name == 'exposure':
-            self.can_attack = True
-            start_sound('mob1_run', loop=True)
-
     def play_attack_sound(self):
         start_sound('mob2_attack')
 
     def attack(self):
-        if not self.now_texture.stagger and self.alive and self.can_attack:
+        if not self.now_texture.stagger and self.alive and self.brain.can_attack:
             self.play_attack_sound()
             self.change_x = 0
             self.now_texture = self.attack_texture
-            self.is_attack = True
+            self.brain.is_attack = True
 
     def change_anim(self):
         if not self.alive:
             return
-        if self.is_attack:
+        if self.brain.is_attack:
             self.now_texture = self.attack_texture
-        elif self.is_aggro:
+        elif self.brain.is_aggro:
             if self.now_texture.stagger:
                 self.now_texture = self.exposure_texture
             else:
@@ -288,80 +440,87 @@ class Mob2(BaseEntity):
             self.now_texture = self.idle_texture
 
     def aggro(self):
-        self.speed *= 3
-        self.is_aggro = True
+        self.patrol.speed *= 3
+        self.brain.is_aggro = True
         self.now_texture = self.exposure_texture
 
 
 class Mob1(Mob2):
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/mob1/idle/mob2_walk{}.png', 2, 10, reverse=True)
-        self.attack_texture = Animation('assets/sprites/mob1/attack/mob2_a{}.png', 5, reverse=True, stagger=True, stop=True, name='attack')
-        self.die_texture = Animation('assets/sprites/mob1/mob1_die/mob1_die{}.png', 9, 10, reverse=True, stagger=True, stop=True, name='die')
-        self.exposure_texture = Animation('assets/sprites/mob1/exposure/mob2_e{}.png', 10, 7, reverse=True, stagger=True, stop=True, name='exposure')
-        self.run_texture = Animation('assets/sprites/mob1/run/mob2_run{}.png', 2, 5, reverse=True)
-
-    def create_view_collision(self, direction):
-        if self.view_collision:
-            self.view_collision.remove_from_sprite_lists()
-        x = self.position[0]
-        if direction == -1:
-            x -= (1080 * 0.1)
-        else:
-            x += (1080 * 0.1)
-        self.view_collision = Attack(x, self.position[1], "assets/sprites/view_collision.png")
+    """Patrolling mob that sees the player and then chases it (chase - systems.chase_system)."""
+    COMPONENTS = ('patrol', 'brain', 'chase')
+    ANIMATED_HIT_BOX = True
+
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/mob1/idle/mob2_walk{}.png', length=2, speed=10, reverse=True),
+        'attack_texture': dict(filepath='assets/sprites/mob1/attack/mob2_a{}.png', length=5, reverse=True, stagger=True, stop=True, name='attack'),
+        'die_texture': dict(filepath='assets/sprites/mob1/mob1_die/mob1_die{}.png', length=9, speed=10, reverse=True, stagger=True, stop=True, name='die'),
+        'exposure_texture': dict(filepath='assets/sprites/mob1/exposure/mob2_e{}.png', length=10, speed=7, reverse=True, stagger=True, stop=True, name='exposure'),
+        'run_texture': dict(filepath='assets/sprites/mob1/run/mob2_run{}.png', length=2, speed=5, reverse=True),
+    }
 
-    def update(self):
-        self.hit_box = arcade.hitbox.RotatableHitBox(self.texture.hit_box_points)
-        self.hit_box.scale = (0.4, 0.4)
-        super().update()
+    def __init__(self, x, y, speed, direction, range_):
+        self.chase = Chase()
+        super().__init__(x, y, speed, direction, range_)
+        # Зона видимости размером как view_collision.png (1080x18 при масштабе 0.4),
+        # поворачивается вслед за направлением движения (systems.sensor_system)
+        self.view_collision = self.add_sensor(1080 * 0.1, 0, 1080 * 0.4, 18 * 0.4)
 
 
 class Artifact(BaseEntity):
+    COMPONENTS = ('trigger',)
+
+    # Раньше артефакт обновлялся дважды за тик, скорости уменьшены вдвое, чтобы анимация не замедлилась
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/artifact/idle/artifact1_{}.png', length=6, speed=5),
+        'active_texture': dict(filepath='assets/sprites/artifact/active/artifact2_{}.png', length=16, speed=4, stop=True, name='active'),
+        'missing_texture': dict(filepath='assets/sprites/block.png', length=1),
+    }
+
     def __init__(self, x, y):
-        self.is_active = False
+        self.trigger = Trigger()
         super().__init__()
 
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/artifact/idle/artifact1_{}.png', 6, speed=10)
-        self.active_texture = Animation('assets/sprites/artifact/active/artifact2_{}.png', 16, speed=7, stop=True, name='active')
-        self.missing_texture = Animation('assets/sprites/block.png', 1)
-
     def active(self):
-        self.is_active = True
+        self.trigger.is_active = True
         self.now_texture = self.active_texture
 
-    def update(self):
-        anim_name = self.update_animation()
-        if anim_name == 'active':
-            self.now_texture = self.missing_texture
-
     def play_attack_sound(self):
         start_sound('mob1_attack')
 
 
 class Portal(BaseEntity):
+    COMPONENTS = ('trigger',)
+
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/block.png', length=1, speed=100),
+        'active_texture': dict(filepath='assets/sprites/portal/p_{}.png', length=9, speed=7),
+    }
+
     def __init__(self, x, y):
-        self.is_active = False
+        self.trigger = Trigger()
         super().__init__()
 
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/block.png', 1, speed=100)
-        self.active_texture = Animation('assets/sprites/portal/p_{}.png', 9, speed=7)
-
     def active(self):
-        self.is_active = True
+        self.trigger.is_active = True
         self.now_texture = self.active_texture
 
 
 class Video(BaseEntity):
+    SNAPSHOT = BaseEntity.SNAPSHOT + ('is_active',)
+
+    ANIMATIONS = {
+        'final_texture': dict(filepath='assets/sprites/video/video (30).jpg', length=1, speed=3, upscale=2.5),
+    }
+    # Кадры ролика не загружаются заранее, а декодируются в фоне во время проигрывания
+    STREAM = dict(filepath='assets/sprites/video/video ({}).jpg', length=30, speed=3, stop=True, upscale=2.5, name='idle')
+
     def __init__(self):
         self.is_active = False
         super().__init__()
 
     def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/video/video ({}).jpg', 30, speed=3, stop=True, upscale=2.5, name='idle')
-        self.final_texture = Animation('assets/sprites/video/video (30).jpg', 1, speed=3, upscale=2.5)
+        super().init_anims()
+        self.idle_texture = VideoStream(**self.STREAM)
 
     def update(self):
         self.is_active = True
@@ -371,6 +530,20 @@ class Video(BaseEntity):
 
 
 class Noise(BaseEntity):
-    def init_anims(self):
-        self.idle_texture = Animation('assets/sprites/noise/n_{}.png', 3, upscale=2.5)
-
+    ANIMATIONS = {
+        'idle_texture': dict(filepath='assets/sprites/noise/n_{}.png', length=3, upscale=2.5),
+    }
+
+
+def all_animations():
+    """Yield (filepath, length, reverse, upscale) of every entity animation, for preloading."""
+    classes = [BaseEntity]
+    seen = set()
+    while classes:
+        cls = classes.pop()
+        classes.extend(cls.__subclasses__())
+        for spec in cls.ANIMATIONS.values():
+            key = (spec['filepath'], spec['length'], spec.get('reverse', False), spec.get('upscale', 1))
+            if key not in seen:
+                seen.add(key)
+                yield key
@@ -0,0 +1,120 @@
+"""Offline texture atlas packer.
+
+Packs the frames of every animation set (and the loose sprite images)
+into a few large PNG pages and writes a JSON manifest with the region,
+image hash and hit box of each frame and the size and modification time
+of its source file (a frame whose source changed is read from the file
+until the atlas is built again). textures.decode_frame then slices
+frames out of the pages instead of opening and decoding one file per
+frame, and skips the hit box computation.
+
+Usage:
+    python atlas.py [--output assets/atlas] [--page-size 4096]
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import arcade
+from PIL import Image
+
+from textures import source_stamp
+
+
+ATLAS_DIR = 'assets/atlas'
+MANIFEST = 'manifest.json'
+# Кадры видео не пакуются: они проигрываются один раз в конце и декодируются потоково
+EXCLUDE = ('assets/sprites/video/',)
+
+
+def collect_frames():
+    """Frame paths grouped by animation set (the folder they are in)."""
+    from Obj import all_animations
+    from loader import IMAGES
+    import textures
+
+    paths = []
+    for filepath, length, reverse, upscale in all_animations():
+        paths.extend(textures.frame_paths(filepath, length))
+    paths.extend(IMAGES)
+
+    sets = defaultdict(list)
+    for path in dict.fromkeys(paths):
+        if not path.startswith(EXCLUDE):
+            sets[os.path.dirname(path)].append(path)
+    return sets
+
+
+def pack(sizes, page_size):
+    """
+    Shelf packing: frames sorted by height are put left to right in rows.
+
+    Returns {key: (page, x, y)} and the list of page sizes.
+    """
+    placements = {}
+    pages = []
+    x = y = shelf = 0
+    for key, (width, height) in sorted(sizes.items(), key=lambda item: -item[1][1]):
+        if width > page_size or height > page_size:
+            raise ValueError(f'{key} is larger than the page ({page_size}px)')
+        if not pages or x + width > page_size:
+            x, y, shelf = 0, y + shelf, 0
+        if not pages or y + height > page_size:
+            pages.append([0, 0])
+            x = y = shelf = 0
+        placements[key] = (len(pages) - 1, x, y)
+        pages[-1][0] = max(pages[-1][0], x + width)
+        pages[-1][1] = max(pages[-1][1], y + height)
+        x += width
+        shelf = max(shelf, height)
+    return placements, pages
+
+
+def build(output=ATLAS_DIR, page_size=4096):
+    os.makedirs(output, exist_ok=True)
+    manifest = {'pages': [], 'frames': {}}
+
+    for set_dir, paths in sorted(collect_frames().items()):
+        textures = {path: arcade.load_texture(path) for path in paths}
+        placements, pages = pack({path: texture.image.size for path, texture in textures.items()}, page_size)
+
+        name = set_dir.replace('assets/sprites', '').strip('/').replace('/', '_') or 'sprites'
+        page_indices = []
+        images = []
+        for number, size in enumerate(pages):
+            page_path = os.path.join(output, f'{name}_{number}.png')
+            page_indices.append(len(manifest['pages']))
+            manifest['pages'].append(page_path)
+            images.append(Image.new('RGBA', tuple(size)))
+
+        for path, texture in textures.items():
+            page, x, y = placements[path]
+            images[page].paste(texture.image, (x, y))
+            width, height = texture.image.size
+            manifest['frames'][path] = {
+                'page': page_indices[page], 'x': x, 'y': y, 'w': width, 'h': height,
+                'hash': texture.image_data.hash,
+                'hit_box': [list(point) for point in texture.hit_box_points],
+                'source': source_stamp(path),
+            }
+
+        for page_path, image in zip(manifest['pages'][page_indices[0]:], images):
+            image.save(page_path, optimize=True)
+        print(f'{name}: {len(paths)} frames -> {len(images)} page(s)')
+
+    with open(os.path.join(output, MANIFEST), 'w') as f:
+        json.dump(manifest, f)
+    print(f'{len(manifest["frames"])} frames in {len(manifest["pages"])} pages, manifest {output}/{MANIFEST}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=ATLAS_DIR)
+    parser.add_argument('--page-size', type=int, default=4096)
+    args = parser.parse_args()
+    build(args.output, args.page_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""Performance benchmarks for the game.
+
+Usage:
+    python bench.py reset [--runs N]
+    python bench.py ticks [--ticks N] [--map PATH] [--sizes W,W,...]
+    python bench.py broadphase [--counts N,N,...] [--ticks N]
+    python bench.py kinematics [--counts N,N,...] [--ticks N]
+    python bench.py entities [--counts N,N,...] [--ticks N]
+    python bench.py physics [--sizes W,W,...] [--platforms N] [--ticks N]
+    python bench.py nav [--counts N,N,...] [--width N] [--ticks N]
+    python bench.py loading [--workers N]
+    python bench.py level [--width N] [--runs N]
+    python bench.py replay FILE [FILE ...]
+    python bench.py startup [--runs N] [--exe PATH]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+
+def bench_reset(args):
+    """Compare the old full rebuild with the snapshot based reset."""
+    import arcade
+    from game_view import GameView
+    from settings import WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE
+
+    window = arcade.Window(WINDOW_WIDTH, WINDOW_HEIGHT, WINDOW_TITLE, visible=False)
+    game = GameView()
+    window.show_view(game)
+
+    for name, method in (('rebuild', game.rebuild), ('reset', game.reset)):
+        method()  # прогрев кэшей
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            method()
+        elapsed = (time.perf_counter() - start) / args.runs
+        print(f'{name:>8}: {elapsed * 1000:8.3f} ms per call ({elapsed * 60:.2%} of a 60 FPS frame)')
+
+    window.close()
+
+
+# Бежит вправо, прыгает и атакует - чтобы работали физика, мобы и столкновения
+DEMO_SCRIPT = {
+    0: ['right'],
+    30: ['jump'],
+    90: ['attack'],
+    120: ['left'],
+    150: ['jump'],
+    200: ['right'],
+}
+
+
+def bench_ticks(args):
+    """Headless simulated ticks per second on map.json and generated maps."""
+    import levelgen
+    import sounds
+    from simulation import Simulation, ScriptedInput
+
+    sounds.disable()
+    maps = [args.map]
+    tmp = tempfile.mkdtemp()
+    for width in args.sizes:
+        maps.append(levelgen.write(
+            os.path.join(tmp, f'generated_{width}.json'),
+            width=width, mobs=max(2, width // 10), platforms=max(6, width // 5),
+        ))
+
+    for path in maps:
+        start = time.perf_counter()
+        sim = Simulation(path)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        sim.run(args.ticks, ScriptedInput(DEMO_SCRIPT, loop=240))
+        elapsed = time.perf_counter() - start
+        print(f'{os.path.basename(path):>24}: load {load * 1000:8.1f} ms, '
+              f'{args.ticks / elapsed:10.1f} ticks/s ({len(sim.moving_objects)} moving objects)')
+
+
+def bench_broadphase(args):
+    """Player vs mobs and view sensors: check every mob vs the grid broadphase."""
+    import random
+    import arcade
+    from broadphase import SpatialGrid
+    from Obj import Sensor
+    from settings import BROADPHASE_CELL_SIZE
+
+    texture = arcade.load_texture('assets/sprites/mob2.png')
+    player = arcade.Sprite(texture, scale=0.055, center_x=0, center_y=0)
+
+    for count in args.counts:
+        rnd = random.Random(count)
+        # Мобы равномерно разбросаны по уровню шириной ~100 экранов
+        width = 1280 * 100
+        mobs = []
+        for _ in range(count):
+            mob = arcade.Sprite(texture, scale=0.055, center_x=rnd.uniform(0, width), center_y=rnd.uniform(0, 1000))
+            mob.sensor = Sensor(mob, 1080 * 0.1, 0, 1080 * 0.4, 18 * 0.4)
+            mob.change_x = rnd.choice((-1, 1))
+            mob.reach = max(mob.width / 2, mob.sensor.offset_x + mob.sensor.half_width)
+            mobs.append(mob)
+
+        def move():
+            for mob in mobs:
+                mob.center_x += mob.change_x
+
+        # Время считается только для фазы столкновений, движение мобов одинаково в обоих вариантах
+        naive = 0.0
+        for tick in range(args.ticks):
+            move()
+            player.center_x = tick * 10 % width
+            start = time.perf_counter()
+            for mob in mobs:
+                if mob.sensor.overlaps(player) or arcade.check_for_collision(player, mob):
+                    pass
+            naive += time.perf_counter() - start
+        naive /= args.ticks
+
+        grid = SpatialGrid(BROADPHASE_CELL_SIZE)
+        gridded = 0.0
+        for tick in range(args.ticks):
+            move()
+            player.center_x = tick * 10 % width
+            start = time.perf_counter()
+            for mob in mobs:
+                grid.update_around(mob, mob.center_x, mob.center_y, mob.reach, mob.height / 2)
+            for mob in grid.query(player.left, player.right, player.bottom, player.top):
+                if mob.sensor.overlaps(player) or arcade.check_for_collision(player, mob):
+                    pass
+            gridded += time.perf_counter() - start
+        gridded /= args.ticks
+
+        print(f'{count:>6} mobs: naive {naive * 1000:9.3f} ms/tick, grid {gridded * 1000:9.3f} ms/tick '
+              f'(x{naive / gridded:.1f})')
+
+
+def bench_kinematics(args):
+    """Moving platforms: MovingObject.update per object vs the NumPy batch."""
+    import random
+    import arcade
+    from kinematics import KinematicBatch
+    from Obj import MovingObject
+
+    texture = arcade.load_texture('assets/sprites/platform.png')
+
+    def make(count):
+        rnd = random.Random(count)
+        objects = []
+        for _ in range(count):
+            sprite = arcade.Sprite(texture, center_x=rnd.uniform(0, 10000), center_y=rnd.uniform(0, 1000))
+            objects.append(MovingObject(sprite, rnd.uniform(0.2, 1.4), [0, -1], rnd.randint(30, 300)))
+        return objects
+
+    for count in args.counts:
+        results = {}
+        for name in ('scalar', 'batch'):
+            objects = make(count)
+            batch = KinematicBatch.create(objects) if name == 'batch' else None
+            elapsed = 0.0
+            for _ in range(args.ticks):
+                # Так платформы двигает физический движок, это время не учитывается
+                for obj in objects:
+                    obj.sprite.center_y += obj.sprite.change_y
+                start = time.perf_counter()
+                if batch:
+                    batch.update()
+                else:
+                    for obj in objects:
+                        obj.update()
+                elapsed += time.perf_counter() - start
+            results[name] = elapsed / args.ticks
+        print(f'{count:>6} platforms: scalar {results["scalar"] * 1000:8.3f} ms/tick, '
+              f'batch {results["batch"] * 1000:8.3f} ms/tick')
+
+
+def bench_entities(args):
+    """Mob, artifact and portal systems (systems.py) per tick for growing entity counts."""
+    import random
+    import sounds
+    import systems
+    from Obj import Mob1, Mob2
+
+    sounds.disable()
+    for count in args.counts:
+        rnd = random.Random(count)
+        mobs = []
+        for i in range(count):
+            x, y = rnd.uniform(0, 1280 * 100), rnd.uniform(0, 1000)
+            if i % 5:
+                mob = Mob1(x, y, speed=1, direction=[rnd.choice((-1, 1)), 0], range_=rnd.randint(100, 400))
+            else:
+                mob = Mob2(x, y, speed=0, direction=[0, 0], range_=0)
+            mob.position = (x, y)
+            mobs.append(mob)
+        world = systems.create_world(mobs, [], [])
+
+        systems.update(world, 1)  # прогрев
+        start = time.perf_counter()
+        for tick in range(2, args.ticks + 2):
+            systems.update(world, tick)
+        elapsed = (time.perf_counter() - start) / args.ticks
+        print(f'{count:>6} entities: {elapsed * 1000:8.3f} ms/tick, {elapsed / count * 1e6:6.2f} us per entity')
+
+
+def bench_physics(args):
+    """Player vs walls: arcade's sprite-list engine vs the solid cell grid, by map width."""
+    import levelgen
+    import profiler
+    import sounds
+    from simulation import Simulation, ScriptedInput
+
+    sounds.disable()
+    tmp = tempfile.mkdtemp()
+    for width in args.sizes:
+        # По умолчанию платформ столько же, сколько на обычной карте: меняется только размер слоя стен
+        path = levelgen.write(os.path.join(tmp, f'generated_{width}.json'), width=width, mobs=2, platforms=args.platforms)
+        results = {}
+        for physics in ('sprites', 'grid'):
+            sim = Simulation(path, physics=physics)
+            profiler.reset()
+            profiler.enable()
+            sim.run(args.ticks, ScriptedInput(DEMO_SCRIPT, loop=240))
+            profiler.enable(False)
+            results[physics] = profiler.percentiles('physics', profiler.SAMPLES)[0]
+        print(f'{width:>6} tiles wide, {args.platforms} platforms: sprites {results["sprites"] * 1000:8.3f} ms/tick, '
+              f'grid {results["grid"] * 1000:8.3f} ms/tick (p50)')
+
+
+def bench_nav(args):
+    """Chasing mobs: navigation grid build vs cache read, and chase cost per tick by the number of chasers."""
+    import levelgen
+    import navigation
+    import sounds
+    import systems
+    from settings import NAV_FIELD_RADIUS, NAV_JUMP_COLUMNS, NAV_JUMP_ROWS, TILE_SCALING
+    from simulation import Simulation
+
+    sounds.disable()
+    tmp = tempfile.mkdtemp()
+    for count in args.counts:
+        path = levelgen.write(os.path.join(tmp, f'chase_{count}.json'), width=args.width, mobs=count + 1, platforms=6)
+        sim = Simulation(path, lod=False)
+        nav = sim.nav
+        start = time.perf_counter()
+        navigation.NavGrid.build(sim.solid_grid, NAV_JUMP_ROWS, NAV_JUMP_COLUMNS)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        navigation.NavGrid.read(navigation.nav_path(path, TILE_SCALING))
+        read = time.perf_counter() - start
+
+        # Все мобы с зоной видимости уже заметили игрока; игрок идёт по уровню, клетка меняется каждые 30 тиков
+        rows = sim.world.view('patrol', 'brain', 'chase')
+        for mob, patrol, brain, chase in rows:
+            mob.aggro()
+            brain.can_attack = True
+            mob.now_texture = mob.run_texture
+        x, y = sim.player.center_x, sim.player.bottom
+        searches = navigation.STATS['searches']
+        start = time.perf_counter()
+        for tick in range(1, args.ticks + 1):
+            sim.flow.follow(x + tick // 30 * nav.cell_width, y)
+            systems.chase_system(rows, tick, sim.flow, x)
+        elapsed = (time.perf_counter() - start) / args.ticks
+        print(f'{len(rows):>6} chasers, {len(nav.cells)} nodes: build {build * 1000:7.2f} ms, cached {read * 1000:6.2f} ms, '
+              f'chase {elapsed * 1000:7.3f} ms/tick, {navigation.STATS["searches"] - searches} field searches '
+              f'(radius {NAV_FIELD_RADIUS})')
+
+
+def bench_loading(args):
+    """Time the background asset loader and print the per-asset cost."""
+    from loader import AssetLoader
+
+    start = time.perf_counter()
+    loader = AssetLoader(workers=args.workers, upload=False)
+    loader.add_game_assets()
+    loader.add_deferred_assets()
+    loader.wait()
+    print(f'loaded with {args.workers} workers in {(time.perf_counter() - start) * 1000:.1f} ms')
+    loader.print_report(args.limit)
+
+
+def bench_level(args):
+    """Level loading: arcade.load_tilemap vs the compiled level cache."""
+    import shutil
+    import arcade
+    import levelcache
+    import levelgen
+    from settings import TILE_SCALING
+
+    tmp = tempfile.mkdtemp()
+    path = levelgen.write(os.path.join(tmp, f'generated_{args.width}.json'), width=args.width,
+                          mobs=max(2, args.width // 10), platforms=max(6, args.width // 5))
+    levelcache.CACHE_DIR = os.path.join(tmp, 'cache')
+    # Текстуры тайлов загружаются один раз, дальше сравнивается только разбор карты и создание спрайтов
+    arcade.load_tilemap(path, scaling=TILE_SCALING)
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(args.runs):
+            func()
+        return (time.perf_counter() - start) / args.runs
+
+    def compile_and_load():
+        shutil.rmtree(levelcache.CACHE_DIR, ignore_errors=True)
+        levelcache.load_tilemap(path, scaling=TILE_SCALING)
+
+    results = {
+        'arcade': timed(lambda: arcade.load_tilemap(path, scaling=TILE_SCALING)),
+        'compile': timed(compile_and_load),
+        'cached': timed(lambda: levelcache.load_tilemap(path, scaling=TILE_SCALING)),
+    }
+    size = os.path.getsize(levelcache.cache_path(path, TILE_SCALING))
+    print(f'{args.width} tiles wide ({size / 1024:.1f} KiB compiled): ' +
+          ', '.join(f'{name} {elapsed * 1000:.1f} ms' for name, elapsed in results.items()))
+
+
+def bench_replay(args):
+    """Headless replay of recorded sessions (main.py --record) with a timing report."""
+    import replay
+
+    failed = False
+    for path in args.files:
+        print(path)
+        report = replay.run_headless(path)
+        replay.print_report(report)
+        failed = failed or report['desync'] is not None
+    if failed:
+        raise SystemExit(1)
+
+
+STARTUP_MARKS = ('window', 'first_frame', 'interactive')
+
+
+def bench_startup(args):
+    """Time to window open, first frame and first game frame, from source and for the PyInstaller build."""
+    import json
+    import statistics
+    import subprocess
+    import sys
+
+    commands = [('source', [sys.executable, 'main.py', '--startup-report'])]
+    if os.path.exists(args.exe):
+        commands.append(('frozen', [os.path.abspath(args.exe), '--startup-report']))
+    else:
+        print(f'frozen build not found at {args.exe} (pyinstaller main.spec), timing the source only')
+
+    print(f'{"":<8}' + ''.join(f'{name:>14}' for name in STARTUP_MARKS) + f'  s, median of {args.runs}')
+    for name, command in commands:
+        runs = []
+        for _ in range(args.runs):
+            # Отсчёт ведётся от момента запуска процесса, включая интерпретатор и распаковку сборки
+            env = dict(os.environ, STARTUP_T0=repr(time.time()))
+            result = subprocess.run(command, env=env, capture_output=True, text=True, timeout=120,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)))
+            marks = [line for line in result.stdout.splitlines() if line.startswith('{')]
+            if result.returncode != 0 or not marks:
+                print(f'{name}: failed with code {result.returncode}')
+                print(result.stderr.strip())
+                break
+            runs.append(json.loads(marks[-1]))
+        if runs:
+            print(f'{name:<8}' + ''.join(f'{statistics.median(run[mark] for run in runs):14.3f}' for mark in STARTUP_MARKS))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    reset = commands.add_parser('reset', help='old rebuild vs snapshot reset')
+    reset.add_argument('--runs', type=int, default=20)
+    reset.set_defaults(func=bench_reset)
+
+    ticks = commands.add_parser('ticks', help='headless simulation ticks per second')
+    ticks.add_argument('--ticks', type=int, default=3000)
+    ticks.add_argument('--map', default='map.json')
+    ticks.add_argument('--sizes', type=lambda value: [int(width) for width in value.split(',') if width],
+                       default=[100, 500], help='widths (in tiles) of generated maps')
+    ticks.set_defaults(func=bench_ticks)
+
+    broadphase = commands.add_parser('broadphase', help='collision checks: naive loop vs spatial grid')
+    broadphase.add_argument('--counts', type=lambda value: [int(count) for count in value.split(',') if count],
+                            default=[10, 100, 1000, 10000])
+    broadphase.add_argument('--ticks', type=int, default=60)
+    broadphase.set_defaults(func=bench_broadphase)
+
+    kinematics = commands.add_parser('kinematics', help='moving platforms: per-object update vs NumPy batch')
+    kinematics.add_argument('--counts', type=lambda value: [int(count) for count in value.split(',') if count],
+                            default=[6, 100, 1000])
+    kinematics.add_argument('--ticks', type=int, default=600)
+    kinematics.set_defaults(func=bench_kinematics)
+
+    entities = commands.add_parser('entities', help='entity systems cost per tick by entity count')
+    entities.add_argument('--counts', type=lambda value: [int(count) for count in value.split(',') if count],
+                          default=[100, 1000, 5000])
+    entities.add_argument('--ticks', type=int, default=300)
+    entities.set_defaults(func=bench_entities)
+
+    physics = commands.add_parser('physics', help='player vs walls: arcade sprite lists vs solid cell grid')
+    physics.add_argument('--sizes', type=lambda value: [int(width) for width in value.split(',') if width],
+                         default=[27, 400, 2000], help='widths (in tiles) of generated maps')
+    physics.add_argument('--platforms', type=int, default=6, help='moving platforms on each map')
+    physics.add_argument('--ticks', type=int, default=1500)
+    physics.set_defaults(func=bench_physics)
+
+    nav = commands.add_parser('nav', help='chasing mobs: navigation grid and flow field cost by chaser count')
+    nav.add_argument('--counts', type=lambda value: [int(count) for count in value.split(',') if count],
+                     default=[10, 100, 1000])
+    nav.add_argument('--width', type=int, default=400)
+    nav.add_argument('--ticks', type=int, default=300)
+    nav.set_defaults(func=bench_nav)
+
+    loading = commands.add_parser('loading', help='background asset loading time per asset')
+    loading.add_argument('--workers', type=int, default=4)
+    loading.add_argument('--limit', type=int, default=15)
+    loading.set_defaults(func=bench_loading)
+
+    level = commands.add_parser('level', help='level loading: arcade tilemap vs compiled cache')
+    level.add_argument('--width', type=int, default=400)
+    level.add_argument('--runs', type=int, default=5)
+    level.set_defaults(func=bench_level)
+
+    replay = commands.add_parser('replay', help='headless replay of recorded input with a timing report')
+    replay.add_argument('files', nargs='+')
+    replay.set_defaults(func=bench_replay)
+
+    startup = commands.add_parser('startup', help='time to window, first frame and interactive (source and frozen)')
+    startup.add_argument('--runs', type=int, default=5)
+    startup.add_argument('--exe', default=os.path.join('dist', 'main', 'main.exe' if os.name == 'nt' else 'main'))
+    startup.set_defaults(func=bench_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""Level loading, per-tick update and memory of the headless simulation."""
+import tracemalloc
+
+from bench import DEMO_SCRIPT
+from simulation import Simulation, ScriptedInput
+
+
+TICKS = 600
+
+
+def test_load(benchmark, baseline, level):
+    # Первый (разогревочный) раунд компилирует уровень в кэш, остальные читают его как при обычном запуске
+    benchmark.pedantic(Simulation, args=(level,), rounds=3, warmup_rounds=1)
+    baseline.time(benchmark)
+
+
+def test_step(benchmark, baseline, level):
+    sim = Simulation(level)
+    inputs = ScriptedInput(DEMO_SCRIPT, loop=240)
+
+    def tick():
+        for action in inputs.actions(sim.tick):
+            sim.apply(action)
+        if 'died' in sim.step():
+            sim.reset()
+
+    benchmark.pedantic(tick, rounds=TICKS, warmup_rounds=60)
+    baseline.time(benchmark)
+
+
+def test_memory(baseline, level):
+    # Общие текстуры и звуки загружает первая симуляция, измеряется то, что добавляет сам уровень
+    Simulation(level)
+    tracemalloc.start()
+    try:
+        sim = Simulation(level)
+        sim.run(TICKS // 2, ScriptedInput(DEMO_SCRIPT, loop=240))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    baseline.memory(peak)
@@ -0,0 +1,31 @@
+"""GameView frames: on_update (simulation steps and camera) and on_draw, in a hidden window."""
+from settings import SIMULATION_DT
+
+
+FRAMES = 120
+
+
+def create_view(window, level):
+    from game_view import GameView
+
+    view = GameView(level)
+    window.show_view(view)
+    return view
+
+
+def test_on_update(benchmark, baseline, window, level):
+    view = create_view(window, level)
+    benchmark.pedantic(view.on_update, args=(SIMULATION_DT,), rounds=FRAMES, warmup_rounds=10)
+    baseline.time(benchmark)
+
+
+def test_draw(benchmark, baseline, window, level):
+    view = create_view(window, level)
+
+    def draw():
+        view.draw()
+        # Команды OpenGL выполняются асинхронно - ждём, пока кадр действительно нарисован
+        window.ctx.finish()
+
+    benchmark.pedantic(draw, setup=lambda: view.on_update(SIMULATION_DT), rounds=FRAMES, warmup_rounds=10)
+    baseline.time(benchmark)
@@ -0,0 +1,123 @@
+"""
+Stress benchmarks on generated levels (levelgen.py), for pytest-benchmark.
+
+    python -m pytest benchmarks                      # fail on regressions against baselines.json
+    python -m pytest benchmarks --update-baselines   # record the current results as the baselines
+
+A result fails when its median time is more than --baseline-tolerance times
+its baseline (memory: MEMORY_TOLERANCE). The baselines are per machine:
+record them again on the machine that runs the benchmarks.
+"""
+import json
+import os
+import sys
+
+# Окно для отрисовки создаётся без дисплея (EGL), до первого импорта arcade
+os.environ.setdefault('ARCADE_HEADLESS', '1')
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# Ассеты и кэш уровней ищутся относительно корня проекта
+os.chdir(ROOT)
+
+import levelgen
+import sounds
+
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+MEMORY_TOLERANCE = 1.2
+
+# Размеры уровней: маленький как map.json, средний и большой - с блоками земли
+SIZES = {
+    'small': dict(width=27, mobs=2, platforms=6),
+    'medium': dict(width=400, mobs=40, platforms=80, blocks=40),
+    'large': dict(width=2000, mobs=200, platforms=400, blocks=200),
+}
+
+# Результаты этого запуска для --update-baselines
+RESULTS = {}
+
+
+def pytest_addoption(parser):
+    parser.addoption('--update-baselines', action='store_true', help='store the results as the new baselines')
+    parser.addoption('--baseline-tolerance', type=float, default=1.5,
+                     help='fail when a median time is more than this times its baseline')
+
+
+def pytest_configure(config):
+    sounds.disable()
+
+
+def pytest_sessionfinish(session):
+    if not session.config.getoption('update_baselines') or not RESULTS:
+        return
+    baselines = load_baselines()
+    baselines.update(RESULTS)
+    with open(BASELINES, 'w') as f:
+        json.dump(dict(sorted(baselines.items())), f, indent=2)
+        f.write('\n')
+
+
+def load_baselines():
+    if not os.path.exists(BASELINES):
+        return {}
+    with open(BASELINES) as f:
+        return json.load(f)
+
+
+class Baseline:
+    def __init__(self, key, stored, tolerance, update):
+        self.key = key
+        self.stored = stored
+        self.tolerance = tolerance
+        self.update = update
+
+    def check(self, name, value, tolerance, unit):
+        RESULTS.setdefault(self.key, {})[name] = value
+        limit = self.stored.get(name)
+        if self.update or limit is None:
+            return
+        if value > limit * tolerance:
+            pytest.fail(f'{self.key}: {name} {value:.6g} {unit}, baseline {limit:.6g} {unit} (x{value / limit:.2f})')
+
+    def time(self, benchmark):
+        """Compare the median of a finished benchmark with the baseline."""
+        if benchmark.stats is None:  # --benchmark-disable
+            return
+        self.check('median', benchmark.stats.stats.median, self.tolerance, 's')
+
+    def memory(self, peak):
+        self.check('peak_bytes', peak, MEMORY_TOLERANCE, 'B')
+
+
+@pytest.fixture
+def baseline(request):
+    config = request.config
+    key = f'{request.node.module.__name__}::{request.node.name}'
+    return Baseline(
+        key, load_baselines().get(key, {}), config.getoption('baseline_tolerance'), config.getoption('update_baselines'),
+    )
+
+
+@pytest.fixture(scope='session', params=list(SIZES))
+def level(request, tmp_path_factory):
+    """Path of a generated map of each size."""
+    path = tmp_path_factory.getbasetemp() / f'stress_{request.param}.json'
+    if not path.exists():
+        levelgen.write(str(path), **SIZES[request.param])
+    return str(path)
+
+
+@pytest.fixture(scope='session')
+def window():
+    import arcade
+    from settings import WINDOW_HEIGHT, WINDOW_WIDTH
+
+    try:
+        window = arcade.Window(WINDOW_WIDTH, WINDOW_HEIGHT, visible=False)
+    except Exception as error:  # нет ни дисплея, ни EGL - отрисовку измерить нельзя
+        pytest.skip(f'no OpenGL context: {error}')
+    yield window
+    window.close()
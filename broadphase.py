@@ -0,0 +1,103 @@
+"""Uniform grid broadphase for entity and trigger collisions.
+
+Objects are binned by their bounding box into square cells. A moving
+object is re-binned only when the range of cells it covers changes, so
+most ticks cost one comparison per object. Queries return candidates
+whose cells overlap the box; the exact (narrowphase) check is up to the
+caller.
+"""
+
+
+class SpatialGrid:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        # item -> (cx0, cx1, cy0, cy1) диапазон клеток, в которых лежит объект
+        self.ranges = {}
+        # item -> интервалы x и y центра, при которых объект остаётся в тех же клетках, и полуразмеры,
+        # для которых они посчитаны (для update_around)
+        self.center_bounds = {}
+
+    def cell_range(self, left, right, bottom, top):
+        size = self.cell_size
+        return int(left // size), int(right // size), int(bottom // size), int(top // size)
+
+    def update(self, item, left, right, bottom, top):
+        """Insert an item or move it to a new bounding box."""
+        self.center_bounds.pop(item, None)
+        new = self.cell_range(left, right, bottom, top)
+        old = self.ranges.get(item)
+        if old == new:
+            return
+        if old is not None:
+            self._unlink(item, old)
+        self.ranges[item] = new
+        cx0, cx1, cy0, cy1 = new
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells.get((cx, cy))
+                if cell is None:
+                    cells[(cx, cy)] = cell = []
+                cell.append(item)
+
+    def update_around(self, item, x, y, half_width, half_height):
+        """Same as update() for a box given by its center and half size."""
+        # Быстрый путь: размер тот же и центр остался в интервале, где набор клеток не меняется
+        bounds = self.center_bounds.get(item)
+        if bounds is not None and bounds[0] <= x < bounds[1] and bounds[2] <= y < bounds[3] \
+                and bounds[4] == half_width and bounds[5] == half_height:
+            return
+
+        self.update(item, x - half_width, x + half_width, y - half_height, y + half_height)
+        size = self.cell_size
+        cx0, cx1, cy0, cy1 = self.ranges[item]
+        self.center_bounds[item] = (
+            max(cx0 * size + half_width, cx1 * size - half_width),
+            min((cx0 + 1) * size + half_width, (cx1 + 1) * size - half_width),
+            max(cy0 * size + half_height, cy1 * size - half_height),
+            min((cy0 + 1) * size + half_height, (cy1 + 1) * size - half_height),
+            half_width,
+            half_height,
+        )
+
+    def remove(self, item):
+        self.center_bounds.pop(item, None)
+        old = self.ranges.pop(item, None)
+        if old is not None:
+            self._unlink(item, old)
+
+    def _unlink(self, item, cell_range):
+        cx0, cx1, cy0, cy1 = cell_range
+        cells = self.cells
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                cell = cells[(cx, cy)]
+                cell.remove(item)
+                if not cell:
+                    del cells[(cx, cy)]
+
+    def query(self, left, right, bottom, top):
+        """Return the items whose cells overlap the box (without duplicates)."""
+        cx0, cx1, cy0, cy1 = self.cell_range(left, right, bottom, top)
+        cells = self.cells
+        if cx0 == cx1 and cy0 == cy1:
+            return list(cells.get((cx0, cy0), ()))
+
+        found = {}
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                for item in cells.get((cx, cy), ()):
+                    found[item] = None
+        return list(found)
+
+    def clear(self):
+        self.cells.clear()
+        self.ranges.clear()
+        self.center_bounds.clear()
+
+    def __len__(self):
+        return len(self.ranges)
+
+    def __contains__(self, item):
+        return item in self.ranges
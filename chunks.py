@@ -0,0 +1,93 @@
+"""Chunked streaming of large tile layers.
+
+The streamed tile layers of a compiled level (levelcache.Level) are split
+into square chunks of CHUNK_TILES tiles. Only the chunks within
+CHUNK_MARGIN of the view have sprites: they are added to the layer's
+SpriteList in the scene (so they are drawn and, for the wall layer,
+collided with by the physics engine) and removed again once the view is
+more than twice the margin away. Per-frame cost and memory follow the
+size of the screen, not of the level.
+"""
+from levelcache import Level
+
+
+STATS = {
+    'loads': 0,
+    'evictions': 0,
+}
+
+
+class ChunkStreamer:
+    def __init__(self, level, scene, layers, chunk_tiles, margin):
+        self.level = level
+        self.scene = scene
+        self.layers = layers
+        self.chunk_tiles = chunk_tiles
+        self.margin = margin
+        self.tile_width = level.tile_width * level.scaling
+        self.tile_height = level.tile_height * level.scaling
+        # (cx, cy) -> {слой: [спрайты]}; cy считается сверху, как строки Tiled
+        self.loaded = {}
+        self.view_range = None
+
+    @classmethod
+    def create(cls, tile_map, scene, layers, chunk_tiles, margin):
+        """Streamer for a compiled level, or None for a tilemap loaded by arcade (fully in memory)."""
+        if not isinstance(tile_map, Level) or not layers:
+            return None
+        return cls(tile_map, scene, layers, chunk_tiles, margin)
+
+    def chunk_range(self, left, right, bottom, top):
+        """Chunks (cx0, cx1, cy0, cy1 inclusive) that overlap the box, clamped to the level."""
+        level = self.level
+        size = self.chunk_tiles
+        col0 = max(0, int(left // self.tile_width))
+        col1 = min(level.width - 1, int(right // self.tile_width))
+        row0 = max(0, level.height - 1 - int(top // self.tile_height))
+        row1 = min(level.height - 1, level.height - 1 - int(bottom // self.tile_height))
+        return col0 // size, col1 // size, row0 // size, row1 // size
+
+    def update(self, left, right, bottom, top):
+        """Load the chunks near the view box and evict the ones far from it."""
+        margin = self.margin
+        view_range = self.chunk_range(left - margin, right + margin, bottom - margin, top + margin)
+        if view_range == self.view_range:
+            return
+        self.view_range = view_range
+
+        # Выгружаются только чанки дальше двойного отступа, чтобы на границе чанки не загружались каждый кадр
+        cx0, cx1, cy0, cy1 = self.chunk_range(
+            left - 2 * margin, right + 2 * margin, bottom - 2 * margin, top + 2 * margin,
+        )
+        for key in [key for key in self.loaded if not (cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1)]:
+            self.evict(key)
+
+        cx0, cx1, cy0, cy1 = view_range
+        for cx in range(cx0, cx1 + 1):
+            for cy in range(cy0, cy1 + 1):
+                if (cx, cy) not in self.loaded:
+                    self.load((cx, cy))
+
+    def load(self, key):
+        cx, cy = key
+        size = self.chunk_tiles
+        col0, row0 = cx * size, cy * size
+        col1 = min(col0 + size, self.level.width)
+        row1 = min(row0 + size, self.level.height)
+        chunk = {}
+        for name in self.layers:
+            sprites = self.level.create_tiles(name, col0, col1, row0, row1)
+            self.scene[name].extend(sprites)
+            chunk[name] = sprites
+        self.loaded[key] = chunk
+        STATS['loads'] += 1
+
+    def evict(self, key):
+        for name, sprites in self.loaded.pop(key).items():
+            sprite_list = self.scene[name]
+            for sprite in sprites:
+                sprite_list.remove(sprite)
+        STATS['evictions'] += 1
+
+    def resident_sprites(self):
+        return sum(len(sprites) for chunk in self.loaded.values() for sprites in chunk.values())
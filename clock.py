@@ -0,0 +1,20 @@
+"""Global animation clock.
+
+Every playing Animation remembers the clock tick at which it was at its
+first frame, so its position is just CLOCK.tick minus that tick: the
+clock moves all playheads at once and nothing is counted per animation.
+Simulation.step advances it once per simulation tick. There is one
+clock, so only one simulation should be stepped at a time.
+"""
+
+
+class AnimationClock:
+    def __init__(self):
+        self.tick = 0
+
+    def advance(self):
+        self.tick += 1
+        return self.tick
+
+
+CLOCK = AnimationClock()
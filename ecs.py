@@ -0,0 +1,124 @@
+"""Entity-component storage for the level's entities.
+
+An entity is a number. Its components are small __slots__ objects kept in
+one store per component name, and a system asks the world for the
+entities that have a set of components (World.view) and walks them in
+one loop, instead of calling update() on each object through the
+Sprite subclasses. The sprite of an entity is only its render proxy:
+position and texture stay in it because physics, collisions and drawing
+read them there, the rest of the state lives in the components.
+
+Components save and restore their fields in place, so the lists built by
+view() stay valid across a level reset.
+"""
+
+
+class Component:
+    __slots__ = ()
+
+    def save(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def restore(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+
+class Patrol(Component):
+    """
+    Walking back and forth along x within range of start_x; direction is -1, 0 (standing) or 1.
+
+    tick is the simulation tick the patrol was last stepped at.
+    """
+    __slots__ = ('start_x', 'range', 'speed', 'direction', 'tick')
+
+    def __init__(self, start_x, range_, speed, direction):
+        self.start_x = start_x
+        self.range = range_
+        self.speed = speed
+        self.direction = direction
+        self.tick = 0
+
+
+class Brain(Component):
+    """Mob AI state."""
+    __slots__ = ('is_aggro', 'is_attack', 'can_attack')
+
+    def __init__(self, can_attack=False):
+        self.is_aggro = False
+        self.is_attack = False
+        self.can_attack = can_attack
+
+
+class Chase(Component):
+    """
+    Following the player over the navigation grid (navigation.py) once the mob is aggro.
+
+    node is the node the mob last stood on, offset_y - how high its center is above the floor.
+    """
+    __slots__ = ('node', 'offset_y')
+
+    def __init__(self):
+        self.node = None
+        self.offset_y = None
+
+
+class Trigger(Component):
+    """Something the player switches on (artifact, portal)."""
+    __slots__ = ('is_active',)
+
+    def __init__(self):
+        self.is_active = False
+
+
+class World:
+    def __init__(self):
+        # entity -> спрайт, которым сущность рисуется
+        self.proxies = []
+        # имя компонента -> {entity: компонент}, в порядке создания сущностей
+        self.stores = {}
+        self._views = {}
+
+    def create(self, proxy, **components):
+        """Add an entity drawn by proxy with the given components; returns the entity number."""
+        entity = len(self.proxies)
+        self.proxies.append(proxy)
+        for name, component in components.items():
+            self.stores.setdefault(name, {})[entity] = component
+        self._views.clear()
+        return entity
+
+    def get(self, entity, name):
+        return self.stores.get(name, {}).get(entity)
+
+    def view(self, *names):
+        """[(proxy, component, ...), ...] of the entities that have all the named components, in creation order."""
+        result = self._views.get(names)
+        if result is None:
+            stores = [self.stores.get(name, {}) for name in names]
+            result = [
+                (self.proxies[entity],) + tuple(store[entity] for store in stores)
+                for entity in stores[0]
+                if all(entity in store for store in stores[1:])
+            ]
+            self._views[names] = result
+        return result
+
+    def select(self, entities, *names):
+        """Like view(), for the given entities only (in their order)."""
+        stores = [self.stores.get(name, {}) for name in names]
+        proxies = self.proxies
+        result = []
+        for entity in entities:
+            row = [proxies[entity]]
+            for store in stores:
+                component = store.get(entity)
+                if component is None:
+                    break
+                row.append(component)
+            else:
+                result.append(tuple(row))
+        return result
+
+    def __len__(self):
+        return len(self.proxies)
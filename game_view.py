@@ -0,0 +1,344 @@
+"""The game screen: cameras, overlays, input and the fixed-step loop around simulation.Simulation."""
+import arcade
+from arcade.types import Color
+
+from Obj import Video, Noise
+from settings import *
+from sounds import *
+from simulation import Simulation
+import profiler
+import render
+import sounds
+import startup
+import textures
+
+
+class GameView(arcade.View):
+    """
+    Main application class.
+    """
+
+    def __init__(self, map_path=MAP_PATH, recorder=None, replay=None, sim=None, assets=None): #отвечает за инициализацию основного игрового уровня или сцены
+        super().__init__()
+        # recorder записывает действия игрока, replay подаёт записанные действия вместо клавиатуры (replay.py)
+        self.recorder = recorder
+        self.replay = replay
+        # Запись проиграна до конца - симуляция больше не идёт, окно закрывается
+        self.replay_finished = False
+        # assets - загрузчик ассетов, которые не нужны для первого кадра (дозагружаются во время игры)
+        self.assets = assets
+
+        # self.camera_sprites - основная камера для отображения игрового мира (спрайтов).
+        # self.camera_bounds - границы камеры, ограничивают перемещение камеры размерами окна.
+        # self.camera_gui - отдельная камера для элементов интерфейса (GUI), чтобы они оставались на месте при прокрутке игрового мира.
+        self.camera_sprites = arcade.Camera2D()
+        self.camera_bounds = self.window.rect
+        self.camera_gui = arcade.Camera2D()
+        #self.camera_shake - эффект "тряски" камеры
+        self.camera_shake = arcade.camera.grips.ScreenShake2D(
+            self.camera_sprites.view_data,
+            max_amplitude=20.0,
+            acceleration_duration=0.2,
+            falloff_time=1,
+            shake_frequency=10.0,
+        )
+        # self.sim - игровой мир (физика, мобы, столкновения), который работает и без окна.
+        # self.scene, self.player и т.д. - ссылки на объекты мира для отрисовки.
+        # Экран загрузки передаёт уже построенный мир, чтобы создание GameView не задерживало кадр
+        self.sim = sim or Simulation(map_path)
+        self.scene = self.sim.scene
+        self.player = self.sim.player
+        self.artifact = self.sim.artifact
+        self.portal = self.sim.portal
+        self.mob1 = self.sim.mob1
+
+        start_sound('background_sound', loop=True)
+
+        # Если в тайлмапе задан цвет фона, он устанавливается как цвет окна.
+        if self.sim.background_color:
+            self.window.background_color = Color.from_iterable(self.sim.background_color)
+
+        # Use the tilemap's size to correctly set the camera's bounds.
+        # Устанавливаются границы движения камеры по размерам карты и окна, чтобы камера не выходила за пределы игрового мира.
+        self.camera_bounds = arcade.LRBT(
+            self.window.width/2.0,
+            self.sim.level_width - self.window.width/2.0,
+            self.window.height/2.0,
+            self.sim.level_height - self.window.height/2,
+        )
+
+        #self.blood - спрайт с изображением крови.
+        #self.blood_list - список, содержащий спрайты крови (для отображения эффекта при ранении).
+        self.blood = arcade.Sprite(textures.load_texture('assets/sprites/Blood.png'))
+        self.blood_list = arcade.SpriteList()
+        self.blood_list.append(self.blood)
+
+        self.hint = arcade.Sprite(textures.load_texture('assets/sprites/hint.png')) #- спрайт с подсказкой для игрока.
+        self.hint.scale = (0.3, 0.3) # (0.3, 0.3) - уменьшение размера спрайта.
+        self.hint_list = arcade.SpriteList() # список спрайтов для подсказок.
+        self.hint_list.append(self.hint) # флаг, показывающий, активна ли подсказка.
+        self.hint_active = True
+
+        self.video = Video()
+        self.video_list = arcade.SpriteList()
+        self.video_list.append(self.video)
+
+        self.noise = Noise()
+        self.noise_list = arcade.SpriteList()
+        self.noise_list.append(self.noise)
+        self.end = False
+
+        # Каждый слой рисуется один раз в заданном порядке: мир - камерой спрайтов, оверлеи - камерой интерфейса
+        self.world_pass = render.RenderPass.from_scene(self.scene, render.WORLD_LAYERS)
+        self.gui_pass = render.RenderPass([
+            ('blood', self.blood_list),
+            ('hint', self.hint_list),
+            ('video', self.video_list),
+            ('noise', self.noise_list),
+        ])
+        self.render_stats_text = arcade.Text('', 0, 0, arcade.color.WHITE, 12)
+
+        # Таблица профайлера (F3) - перцентили времени по областям за последние кадры, F4 - сохранить в profile.csv
+        self.profile_visible = DEBUG
+        self.profile_text = arcade.Text(
+            '', 0, 0, arcade.color.YELLOW, 11, width=420, multiline=True, font_name=('Consolas', 'Courier New'),
+        )
+
+        # Накопленное время, ещё не отработанное симуляцией (шаг SIMULATION_DT)
+        self.accumulator = 0.0
+
+        # Начальное состояние оверлеев - reset возвращает к нему вместе с миром
+        self.snapshot = [(entity, entity.save_state()) for entity in (self.video, self.noise)]
+
+    def reset(self):
+        """Сброс игры к исходному состоянию без повторной загрузки уровня."""
+        stop_all_sounds(keep=('background_sound',))
+
+        self.sim.reset()
+        for entity, state in self.snapshot:
+            entity.restore_state(state)
+
+        self.camera_shake.stop()
+        self.camera_sprites.position = self.player.position
+        self.update_view()
+        self.hint_active = True
+        self.end = False
+
+    def rebuild(self):
+        """Старый вариант reset: полностью пересоздаёт уровень, камеры и физику."""
+        stop_all_sounds()
+        self.__init__(self.sim.map_path, self.recorder, self.replay, assets=self.assets)
+        if DEBUG:
+            # После первого запуска reset не должен давать ни одного frame_misses
+            print('textures:', textures.STATS)
+            print('sounds:', sounds.report())
+            textures.reset_stats()
+
+    def on_draw(self):
+        """Render the screen."""
+        with profiler.scope('draw'):
+            self.draw()
+        profiler.end_frame()
+        # Первый кадр игры нарисован - игра отвечает на ввод
+        if startup.mark('interactive') and startup.REPORT:
+            startup.print_report()
+            arcade.exit()
+
+    def draw(self):
+        # Clear the screen to the background color
+        self.clear()
+        render.begin_frame()
+        self.camera_shake.update_camera()
+        # Спрайты рисуются между двумя последними тиками симуляции, чтобы движение было плавным при любом FPS
+        positions = self.sim.interpolate(self.accumulator / SIMULATION_DT)
+        # Draw the map with the sprite camera
+        with self.camera_sprites.activate():
+            # Draw our Scene
+            self.world_pass.draw(render.camera_view(self.camera_sprites))
+            if DEBUG:
+                self.scene.draw_hit_boxes(
+                    (255, 0, 0),
+                    2,
+                    names=[
+                        'moving_objects',
+                        'player',
+                        'mobs',
+                        'portal',
+                        'artifact',
+                    ]
+                )
+                for mob in self.sim.mobs_spritelist:
+                    for sensor in mob.sensors:
+                        sensor.draw()
+        self.sim.restore_positions(positions)
+
+        # Draw the score with the gui camera
+        with self.camera_gui.activate():
+            # Draw our score on the screen. The camera keeps it in place.
+            self.blood_list.visible = not self.player.alive
+            self.hint_list.visible = self.player.alive and self.hint_active
+            self.video_list.visible = self.end
+            self.gui_pass.draw()
+            if DEBUG:
+                self.render_stats_text.text = (
+                    'draw calls {draw_calls}, sprites {sprites}, uploads {uploads} ({upload_bytes} B), '
+                    'skipped {skipped}, culled {culled}'.format(**render.STATS)
+                )
+                self.render_stats_text.position = (
+                    self.player.center_x - WINDOW_WIDTH / 2 + 10, self.player.center_y + WINDOW_HEIGHT / 2 - 20,
+                )
+                self.render_stats_text.draw()
+            if self.profile_visible and profiler.ENABLED:
+                # Текст пересобирается раз в полсекунды, иначе он сам заметно влияет на время кадра
+                if self.sim.tick % 30 == 0 or not self.profile_text.text:
+                    self.profile_text.text = '\n'.join(profiler.report_lines())
+                self.profile_text.position = (
+                    self.player.center_x - WINDOW_WIDTH / 2 + 10, self.player.center_y + WINDOW_HEIGHT / 2 - 40,
+                )
+                self.profile_text.draw()
+        self.camera_shake.readjust_camera()
+
+    def on_key_press(self, key, modifiers):
+        """Called whenever a key is pressed."""
+
+        if key == arcade.key.UP or key == arcade.key.W:
+            self.player_input('jump')
+        elif key == arcade.key.SPACE:
+            self.player_input('attack')
+        elif key == arcade.key.RIGHT or key == arcade.key.D:
+            self.player_input('right')
+        elif key == arcade.key.LEFT or key == arcade.key.A:
+            self.player_input('left')
+        elif key == arcade.key.R:
+            self.player_input('reset')
+        elif key == arcade.key.E:
+            self.player_input('activate')
+        elif key == arcade.key.TAB:
+            self.hint_active = not self.hint_active
+        elif key == arcade.key.F3 and DEBUG:
+            self.profile_visible = not self.profile_visible
+        elif key == arcade.key.F4 and DEBUG:
+            print('profile saved to', profiler.export('profile.csv'))
+
+    def on_key_release(self, key, modifiers):
+        """Called when the user releases a key."""
+        if key == arcade.key.RIGHT or key == arcade.key.D:
+            self.player_input('stop')
+        if key == arcade.key.LEFT or key == arcade.key.A:
+            self.player_input('stop')
+
+    def player_input(self, action):
+        """Action from the keyboard: ignored while a replay is playing, otherwise recorded and applied."""
+        if self.replay:
+            return
+        if self.recorder:
+            self.recorder.record(action)
+        self.apply(action)
+
+    def apply(self, action):
+        if action == 'reset':
+            self.reset()
+        elif self.sim.apply(action) and action == 'activate':
+            self.camera_shake.start()
+
+    def center_camera_to_player(self):
+        # Move the camera to center on the player
+        self.camera_sprites.position = arcade.math.smerp_2d(
+            self.camera_sprites.position,
+            self.player.position,
+            self.window.delta_time,
+            FOLLOW_DECAY_CONST,
+        )
+
+        # Constrain the camera's position to the camera bounds.
+        self.camera_sprites.view_data.position = arcade.camera.grips.constrain_xy(
+            self.camera_sprites.view_data, self.camera_bounds
+        )
+        self.camera_gui.position = self.blood.position = self.noise.position = self.video.position = self.player.position
+        self.hint.position = [
+            self.player.position[0] + WINDOW_WIDTH // 2 - self.hint.width * 0.55,
+            self.player.position[1] + WINDOW_HEIGHT // 2 - self.hint.height * 0.6
+        ]
+
+    def on_update(self, delta_time: float):
+        """Movement and game logic"""
+        profiler.begin_frame()
+        sounds.new_frame()
+        if self.assets and self.assets.poll(budget=0.002):
+            self.assets = None
+
+        # Симуляция идёт фиксированными шагами SIMULATION_DT независимо от частоты кадров.
+        # Если кадр был слишком долгим, делается не больше MAX_SIMULATION_STEPS шагов, остальное время отбрасывается.
+        self.accumulator += delta_time
+        steps = 0
+        with profiler.scope('simulation'):
+            while self.accumulator >= SIMULATION_DT and not self.replay_finished:
+                if steps == MAX_SIMULATION_STEPS:
+                    self.accumulator %= SIMULATION_DT
+                    break
+                self.fixed_update()
+                self.accumulator -= SIMULATION_DT
+                steps += 1
+
+        # Position the camera
+        with profiler.scope('camera'):
+            self.center_camera_to_player()
+            self.camera_shake.update(delta_time)
+            self.update_view()
+
+    def update_view(self):
+        """Tell the simulation what the camera sees, so tile chunks around it are loaded."""
+        self.sim.view = render.camera_view(self.camera_sprites)
+        self.sim.update_chunks()
+
+    def fixed_update(self):
+        """One simulation tick plus the per-tick overlay animations."""
+        if self.replay:
+            for action in self.replay.actions(self.replay.tick):
+                self.apply(action)
+        events = self.sim.step(SIMULATION_DT)
+
+        #Игрок погиб и анимация смерти закончилась - перезапуск уровня.
+        if 'died' in events:
+            self.reset()
+        #Моб атаковал игрока - эффект тряски камеры.
+        if 'hit' in events:
+            self.camera_shake.start()
+        #Игрок вошёл в активный портал - проигрывается звук победы и видео.
+        if 'win' in events:
+            start_sound('win')
+        self.end = self.sim.end
+
+        if self.end:
+            self.video.update()
+
+        self.noise.update()
+
+        if self.recorder:
+            self.recorder.advance(self.sim)
+        if self.replay:
+            self.replay.advance(self.sim)
+            if self.replay.finished():
+                self.finish_replay()
+
+    def finish_replay(self):
+        # arcade.exit() только ставит флаг выхода: оставшиеся шаги этого кадра не должны повторять отчёт
+        self.replay_finished = True
+        if self.replay.desync is None:
+            print(f'replay finished after {self.replay.ticks} ticks, matches the recording')
+        else:
+            print(f'replay differs from the recording from tick {self.replay.desync}')
+        for line in profiler.report_lines(profiler.SAMPLES):
+            print('  ' + line)
+        arcade.exit()
+
+    #Метод on_resize(self, width: int, height: int) в библиотеке Arcade вызывается автоматически при изменении размера окна игры и служит для корректной обработки этого события.
+    def on_resize(self, width: int, height: int):
+        """ Resize window """
+        #super().on_resize(width, height) - это важно, так как базовый метод обновляет внутренние параметры окна и системы координат. Без этого вызова координаты и отображение могут сбиться
+        super().on_resize(width, height)
+
+        # Update the cameras to match the new window size
+        self.camera_sprites.match_window()
+        # The position argument keeps `0, 0` in the bottom left corner.
+        self.camera_gui.match_window(position=True)
@@ -0,0 +1,463 @@
+"""Platformer physics against the solid tiles kept as a grid.
+
+arcade.PhysicsEnginePlatformer checks the player against every sprite of
+the wall layer it is given and resolves a hit by moving the player a
+pixel (or a quarter of one) at a time and checking again. The solid
+tiles sit on a regular grid, so SolidGrid keeps them as one byte per
+cell, and GridPhysicsEngine only looks at the cells the player's box
+covers or sweeps through: the cost of a tick is the number of cells
+touched, whatever the size of the level, and the wall layer needs no
+sprites for collisions (the streamed chunks are only drawn).
+
+A move is resolved as a swept box, y first and then x like in arcade's
+engine: the player stops exactly at the edge of the first solid cell in
+its way, and walking into a step no higher than the x speed climbs it
+(arcade's ramp_up). Shapes that are not whole cells - moving platforms,
+tiles with their own hit box - are checked by their polygons with
+arcade's collision functions; landing on a platform and riding it are
+resolved exactly too (GridPhysicsEngine).
+"""
+import math
+
+import arcade
+
+from levelcache import Level
+
+
+# Касание края клетки - ещё не пересечение
+EPSILON = 1e-6
+
+
+def _fills_cell(points, half_width, half_height):
+    """Whether a hit box (points relative to the centre) is the whole cell rectangle."""
+    if len(points) != 4:
+        return False
+    corners = {(x * half_width, y * half_height) for x in (-1, 1) for y in (-1, 1)}
+    for x, y in points:
+        for corner_x, corner_y in corners:
+            if abs(x - corner_x) < EPSILON and abs(y - corner_y) < EPSILON:
+                corners.discard((corner_x, corner_y))
+                break
+        else:
+            return False
+    return not corners
+
+
+def _height_range(points, left, right):
+    """Lowest and highest y of a convex polygon within the strip left..right, or None if it is outside the strip."""
+    left += EPSILON
+    right -= EPSILON
+    low = high = None
+    for i in range(len(points)):
+        x1, y1 = points[i - 1]
+        x2, y2 = points[i]
+        if x1 > x2:
+            x1, y1, x2, y2 = x2, y2, x1, y1
+        start = max(x1, left)
+        end = min(x2, right)
+        if start > end:
+            continue
+        if x2 - x1 < EPSILON:
+            heights = (y1, y2)
+        else:
+            slope = (y2 - y1) / (x2 - x1)
+            heights = (y1 + (start - x1) * slope, y1 + (end - x1) * slope)
+        for y in heights:
+            if low is None or y < low:
+                low = y
+            if high is None or y > high:
+                high = y
+    return None if low is None else (low, high)
+
+
+class SolidGrid:
+    """
+    Solid cells of a tile layer, one byte per cell, row 0 at the bottom of the level.
+
+    Tiles whose hit box is not their whole cell are not in the grid but in irregular,
+    a SpriteList for polygon checks.
+    """
+
+    def __init__(self, width, height, cell_width, cell_height):
+        self.width = width
+        self.height = height
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.cells = bytearray(width * height)
+        self.irregular = arcade.SpriteList()
+
+    @classmethod
+    def create(cls, tile_map, layer):
+        """Grid of a tile layer of a compiled level (levelcache.Level) or of an arcade.TileMap."""
+        if isinstance(tile_map, Level):
+            return cls.from_level(tile_map, layer)
+        return cls.from_sprites(
+            tile_map.sprite_lists[layer], tile_map.width, tile_map.height,
+            tile_map.tile_width * tile_map.scaling, tile_map.tile_height * tile_map.scaling,
+        )
+
+    @classmethod
+    def from_level(cls, level, layer):
+        """From the GIDs in the file: the tiles do not have to be created (the layer may be streamed)."""
+        scaling = level.scaling
+        grid = cls(level.width, level.height, level.tile_width * scaling, level.tile_height * scaling)
+        gids = level.gids(layer)
+        width = level.width
+        half_width = grid.cell_width / 2
+        half_height = grid.cell_height / 2
+
+        # Проверка формы делается один раз на каждый вид тайла
+        whole = {}
+        for gid in set(gids):
+            if gid:
+                texture = level.tile(gid)[0]
+                whole[gid] = (
+                    abs(texture.width * scaling / 2 - half_width) < EPSILON
+                    and abs(texture.height * scaling / 2 - half_height) < EPSILON
+                    and _fills_cell([(x * scaling, y * scaling) for x, y in texture.hit_box_points], half_width, half_height)
+                )
+
+        cells = grid.cells
+        for row in range(level.height):
+            # Строки Tiled идут сверху вниз
+            base = (level.height - 1 - row) * width
+            for col, gid in enumerate(gids[row * width:(row + 1) * width]):
+                if gid:
+                    if whole[gid]:
+                        cells[base + col] = 1
+                    else:
+                        grid.irregular.extend(level.create_tiles(layer, col, col + 1, row, row + 1))
+        return grid
+
+    @classmethod
+    def from_sprites(cls, sprites, width, height, cell_width, cell_height):
+        """From the tile sprites of a layer loaded whole (arcade.load_tilemap)."""
+        grid = cls(width, height, cell_width, cell_height)
+        half_width = cell_width / 2
+        half_height = cell_height / 2
+        for sprite in sprites:
+            col = round(sprite.left / cell_width)
+            row = round(sprite.bottom / cell_height)
+            x, y = sprite.position
+            if (
+                0 <= col < width and 0 <= row < height
+                and abs(x - (col * cell_width + half_width)) < EPSILON
+                and abs(y - (row * cell_height + half_height)) < EPSILON
+                and _fills_cell([(px - x, py - y) for px, py in sprite.hit_box.get_adjusted_points()], half_width, half_height)
+            ):
+                grid.cells[row * width + col] = 1
+            else:
+                grid.irregular.append(sprite)
+        return grid
+
+    @staticmethod
+    def _span(low, high, size, count):
+        """First and last cell that overlap low..high by more than EPSILON, clamped to the grid."""
+        return max(0, math.floor((low + EPSILON) / size)), min(count - 1, math.ceil((high - EPSILON) / size) - 1)
+
+    def _row_solid(self, row, col0, col1):
+        base = row * self.width
+        return self.cells.find(1, base + col0, base + col1 + 1) != -1
+
+    def _col_solid(self, col, row0, row1):
+        cells = self.cells
+        width = self.width
+        for row in range(row0, row1 + 1):
+            if cells[row * width + col]:
+                return True
+        return False
+
+    def blocked(self, left, right, bottom, top):
+        """Whether the box overlaps a solid cell."""
+        col0, col1 = self._span(left, right, self.cell_width, self.width)
+        row0, row1 = self._span(bottom, top, self.cell_height, self.height)
+        if col0 > col1:
+            return False
+        for row in range(row0, row1 + 1):
+            if self._row_solid(row, col0, col1):
+                return True
+        return False
+
+    def sweep_down(self, left, right, bottom, distance):
+        """Top of the first solid cell the box meets moving down by distance, or None."""
+        col0, col1 = self._span(left, right, self.cell_width, self.width)
+        row0, row1 = self._span(bottom - distance, bottom, self.cell_height, self.height)
+        if col0 <= col1:
+            for row in range(row1, row0 - 1, -1):
+                if self._row_solid(row, col0, col1):
+                    return (row + 1) * self.cell_height
+        return None
+
+    def sweep_up(self, left, right, top, distance):
+        """Bottom of the first solid cell the box meets moving up by distance, or None."""
+        col0, col1 = self._span(left, right, self.cell_width, self.width)
+        row0, row1 = self._span(top, top + distance, self.cell_height, self.height)
+        if col0 <= col1:
+            for row in range(row0, row1 + 1):
+                if self._row_solid(row, col0, col1):
+                    return row * self.cell_height
+        return None
+
+    def sweep_right(self, bottom, top, right, distance):
+        """Left edge of the first solid cell the box meets moving right by distance, or None."""
+        row0, row1 = self._span(bottom, top, self.cell_height, self.height)
+        col0, col1 = self._span(right, right + distance, self.cell_width, self.width)
+        if row0 <= row1:
+            for col in range(col0, col1 + 1):
+                if self._col_solid(col, row0, row1):
+                    return col * self.cell_width
+        return None
+
+    def sweep_left(self, bottom, top, left, distance):
+        """Right edge of the first solid cell the box meets moving left by distance, or None."""
+        row0, row1 = self._span(bottom, top, self.cell_height, self.height)
+        col0, col1 = self._span(left - distance, left, self.cell_width, self.width)
+        if row0 <= row1:
+            for col in range(col1, col0 - 1, -1):
+                if self._col_solid(col, row0, row1):
+                    return (col + 1) * self.cell_width
+        return None
+
+
+class GridPhysicsEngine:
+    """
+    arcade.PhysicsEnginePlatformer with the walls given as a SolidGrid.
+
+    Has what the simulation uses of arcade's engine: update(), can_jump() and
+    jumps_since_ground. Moving platforms are kinematic bodies. With a
+    kinematics.KinematicBatch (bodies) it moves them and only the platforms in
+    its grid cells around the player are checked. Without one they move by
+    their change_x/change_y (boundary_* limits are not supported: MovingObject
+    turns them around) and all of them are checked.
+
+    The player lands on a platform, or hits its head on one, at the exact
+    height of the platform's polygon under it. A player standing on a platform
+    (ride) moves with it before its own move, so riding needs no collision
+    resolution.
+    """
+
+    def __init__(self, player_sprite, grid, gravity_constant=0.5, platforms=None, bodies=None, walls=None):
+        self.player_sprite = player_sprite
+        self.grid = grid
+        self.gravity_constant = gravity_constant
+        self.platforms = platforms if platforms is not None else arcade.SpriteList()
+        self.bodies = bodies
+        self.jumps_since_ground = 0
+        # Платформа, на которой игрок стоит после последнего шага
+        self.ride = None
+        # Стены не по сетке проверяются по многоугольникам, как в arcade
+        self.polygons = [grid.irregular] + list(walls or ())
+
+    def nearby_platforms(self, left, right, bottom, top):
+        if self.bodies is not None:
+            return self.bodies.query(left, right, bottom, top)
+        return self.platforms
+
+    def polygon_hits(self, sprite):
+        """Polygon walls and platforms the sprite overlaps."""
+        hits = arcade.check_for_collision_with_lists(sprite, self.polygons)
+        for platform in self.nearby_platforms(sprite.left, sprite.right, sprite.bottom, sprite.top):
+            if arcade.check_for_collision(sprite, platform):
+                hits.append(platform)
+        return hits
+
+    def overlaps(self, sprite):
+        """Whether the sprite overlaps a solid cell or any of the polygon obstacles."""
+        return (
+            self.grid.blocked(sprite.left, sprite.right, sprite.bottom, sprite.top)
+            or bool(self.polygon_hits(sprite))
+        )
+
+    def platform_below(self, left, right, bottom, distance):
+        """(surface y, platform) of the highest platform the box meets moving down by distance, or (None, None)."""
+        best = best_platform = None
+        for platform in self.nearby_platforms(left, right, bottom - distance, bottom):
+            heights = _height_range(platform.hit_box.get_adjusted_points(), left, right)
+            if heights is not None:
+                surface = heights[1]
+                if bottom - distance < surface <= bottom + EPSILON and (best is None or surface > best):
+                    best, best_platform = surface, platform
+        return best, best_platform
+
+    def platform_above(self, left, right, top, distance):
+        """(y, platform) of the lowest platform underside the box meets moving up by distance, or (None, None)."""
+        best = best_platform = None
+        for platform in self.nearby_platforms(left, right, top, top + distance):
+            heights = _height_range(platform.hit_box.get_adjusted_points(), left, right)
+            if heights is not None:
+                underside = heights[0]
+                if top - EPSILON <= underside < top + distance and (best is None or underside < best):
+                    best, best_platform = underside, platform
+        return best, best_platform
+
+    def can_jump(self, y_distance=5):
+        """Whether something solid is within y_distance under the player."""
+        player = self.player_sprite
+        left, right, bottom = player.left, player.right, player.bottom
+        on_ground = (
+            self.grid.sweep_down(left, right, bottom, y_distance) is not None
+            or self.platform_below(left, right, bottom, y_distance)[0] is not None
+        )
+        if not on_ground and any(self.polygons):
+            player.center_y -= y_distance
+            on_ground = bool(arcade.check_for_collision_with_lists(player, self.polygons))
+            player.center_y += y_distance
+        if on_ground:
+            self.jumps_since_ground = 0
+        return on_ground
+
+    def update(self):
+        """Apply gravity, move the platforms and then the player; returns the polygon obstacles hit."""
+        player = self.player_sprite
+        player.change_y -= self.gravity_constant
+
+        if self.bodies is not None:
+            self.bodies.advance()
+        else:
+            for platform in self.platforms:
+                if platform.change_x or platform.change_y:
+                    platform.position = (platform.center_x + platform.change_x, platform.center_y + platform.change_y)
+
+        # Стоящий на платформе едет вместе с ней: сдвиг тот же, что у платформы за этот тик
+        ride = self.ride
+        if ride is not None and (ride.change_x or ride.change_y):
+            player.position = (player.center_x + ride.change_x, player.center_y + ride.change_y)
+
+        # Платформа могла въехать в игрока
+        if self.overlaps(player):
+            self.wiggle_until_free(player)
+
+        hits = self.move_y(player)
+        if player.change_x:
+            for sprite in self.move_x(player):
+                if sprite not in hits:
+                    hits.append(sprite)
+        return hits
+
+    def move_y(self, player):
+        grid = self.grid
+        change_y = player.change_y
+        left, right = player.left, player.right
+        platform = None
+        if change_y < 0:
+            bottom = player.bottom
+            edge = grid.sweep_down(left, right, bottom, -change_y)
+            surface, platform = self.platform_below(left, right, bottom, -change_y)
+            if surface is not None and (edge is None or surface > edge):
+                # Чуть выше поверхности: на скосе многоугольника проверка arcade иначе может счесть касание пересечением
+                edge = surface + EPSILON
+            else:
+                platform = None
+            if edge is not None:
+                player.center_y += edge - bottom
+        elif change_y > 0:
+            top = player.top
+            edge = grid.sweep_up(left, right, top, change_y)
+            underside, platform = self.platform_above(left, right, top, change_y)
+            if underside is not None and (edge is None or underside < edge):
+                edge = underside - EPSILON
+            else:
+                platform = None
+            if edge is not None:
+                player.center_y += edge - top
+        else:
+            edge = None
+        if edge is not None:
+            player.change_y = 0.0
+        elif change_y:
+            player.center_y += change_y
+        self.ride = platform if change_y < 0 else None
+
+        hits = [platform] if platform is not None else []
+        polygon_hits = arcade.check_for_collision_with_lists(player, self.polygons)
+        if polygon_hits:
+            # Стены-многоугольники разрешаются как в arcade: по пикселю вниз от потолка, по четверти вверх от пола
+            if change_y > 0:
+                while self.overlaps(player):
+                    player.center_y -= 1
+            elif change_y < 0:
+                for item in polygon_hits:
+                    while arcade.check_for_collision(player, item):
+                        player.center_y += 0.25
+            player.change_y = 0.0
+            hits.extend(polygon_hits)
+        return hits
+
+    def move_x(self, player):
+        grid = self.grid
+        change_x = player.change_x
+        distance = abs(change_x)
+        original_x, original_y = player.position
+        if change_x > 0:
+            edge = grid.sweep_right(player.bottom, player.top, player.right, distance)
+            moved = distance if edge is None else edge - player.right
+        else:
+            edge = grid.sweep_left(player.bottom, player.top, player.left, distance)
+            moved = distance if edge is None else player.left - edge
+
+        rise = 0.0
+        if edge is not None:
+            # Ступенька не выше скорости по X - игрок на неё поднимается
+            left = player.left + change_x
+            right = player.right + change_x
+            step = grid.sweep_down(left, right, player.bottom + distance, distance)
+            if step is not None and player.bottom < step <= player.bottom + distance:
+                rise = step - player.bottom
+                if grid.blocked(left, right, player.bottom + rise, player.top + rise):
+                    rise = 0.0
+                else:
+                    moved = distance
+        player.position = (original_x + math.copysign(moved, change_x), original_y + rise)
+
+        hits = self.polygon_hits(player)
+        if hits:
+            self.search_x(player, original_x, original_y, math.copysign(1, change_x), moved)
+        return hits
+
+    def search_x(self, player, original_x, original_y, direction, distance):
+        """arcade's binary search for how far the player can go in x, with ramp_up, against all obstacles."""
+        upper = distance
+        lower = 0.0
+        current = distance
+        rise = 0.0
+        while True:
+            player.position = (original_x + current * direction, original_y)
+            rise = 0.0
+            if self.overlaps(player):
+                rise = current
+                player.center_y = original_y + rise
+                if self.overlaps(player):
+                    blocked = True
+                    rise = 0.0
+                else:
+                    while not self.overlaps(player) and rise > 0:
+                        rise -= 1
+                        player.center_y = original_y + rise
+                    rise += 1
+                    blocked = False
+                if blocked:
+                    upper = current - 1
+                    if upper - lower <= 0:
+                        current = lower
+                        rise = 0.0
+                        break
+                    current = (upper + lower) // 2
+                else:
+                    break
+            else:
+                lower = current
+                if upper - lower <= 0:
+                    break
+                current = (upper + lower) // 2 + (upper + lower) % 2
+        player.position = (original_x + current * direction, original_y + rise)
+
+    def wiggle_until_free(self, sprite):
+        """Move the sprite out of what it overlaps, trying 8 directions at doubling distances (as arcade does)."""
+        x, y = sprite.position
+        distance = 1
+        while True:
+            for dx, dy in ((0, 1), (0, -1), (1, 0), (-1, 0), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+                sprite.position = (x + dx * distance, y + dy * distance)
+                if not self.overlaps(sprite):
+                    return
+            distance *= 2
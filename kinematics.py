@@ -0,0 +1,138 @@
+"""Vectorized update of moving platforms (MovingObject).
+
+Positions, start points, speeds, ranges and directions of all platforms
+are kept in NumPy arrays and updated with a few array operations per
+tick. Sprites are written only when their velocity changes, which for a
+patrolling platform happens once per turn around.
+
+A lazy batch (the one GridPhysicsEngine uses) moves the platforms
+itself (advance()) and writes a sprite's position only when the sprite
+is needed: returned by query() for collisions or near the view for
+drawing (sync()). With hundreds of platforms the ones off screen cost
+one row of each array operation. Otherwise the physics engine moves the
+sprites by change_x/change_y and the batch follows them.
+
+A lazy batch also keeps the platforms in a SpatialGrid by their number.
+The cell ranges of all platforms are compared as one array each tick
+and only the platforms that crossed into other cells are re-binned, so
+query() finds the platforms around a box without looking at the others.
+
+NumPy is optional: without it create() returns None and the simulation
+calls MovingObject.update for each platform as before.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from broadphase import SpatialGrid
+
+
+class KinematicBatch:
+    def __init__(self, moving_objects, cell_size=512, lazy=False):
+        self.objects = list(moving_objects)
+        self.sprites = [obj.sprite for obj in self.objects]
+        self.speed = np.array([obj.speed for obj in self.objects], dtype=np.float64)
+        self.range = np.array([obj.range for obj in self.objects], dtype=np.float64)
+        self.start_direction = np.array([obj.direction for obj in self.objects], dtype=np.float64).reshape(-1, 2)
+        self.start_coords = np.array([obj.start_coords for obj in self.objects], dtype=np.float64).reshape(-1, 2)
+        # Границы хитбокса относительно центра: left, right, bottom, top
+        self.box = np.array(
+            [(s.left - s.center_x, s.right - s.center_x, s.bottom - s.center_y, s.top - s.center_y) for s in self.sprites],
+            dtype=np.float64,
+        ).reshape(-1, 4)
+        self.lazy = lazy
+        self.index = SpatialGrid(cell_size)
+        self.reset()
+
+    @classmethod
+    def create(cls, moving_objects, cell_size=512, lazy=False):
+        """Build a batch, or return None if NumPy is missing or there is nothing to move."""
+        if np is None or not moving_objects:
+            return None
+        return cls(moving_objects, cell_size, lazy)
+
+    def reset(self):
+        """Back to the start points; sprite positions are restored by MovingObject.restore_state."""
+        # Копия позиций спрайтов: физический движок сдвигает их ровно на change_x/change_y за тик,
+        # поэтому сами спрайты каждый тик читать не нужно
+        self.position = self.start_coords.copy()
+        self.direction = self.start_direction.copy()
+        self.velocity = np.zeros((len(self.objects), 2))
+        # Позиции, записанные в спрайты (ленивый режим)
+        self.written = self.start_coords.copy()
+        self.index.clear()
+        self.cells = None
+        self.reindex()
+
+    def bounds(self):
+        """left, right, bottom, top of every platform as an (n, 4) array."""
+        return self.position[:, (0, 0, 1, 1)] + self.box
+
+    def reindex(self):
+        """Re-bin the platforms whose range of grid cells changed."""
+        bounds = self.bounds()
+        cells = np.floor_divide(bounds, self.index.cell_size).astype(np.int64)
+        if self.cells is None:
+            changed = range(len(self.objects))
+        else:
+            changed = np.flatnonzero((cells != self.cells).any(axis=1)).tolist()
+        update = self.index.update
+        for i in changed:
+            left, right, bottom, top = bounds[i].tolist()
+            update(i, left, right, bottom, top)
+        self.cells = cells
+
+    def advance(self):
+        """Move the platforms by their velocity (the physics engine's part of the tick)."""
+        self.position += self.velocity
+        # Сетку опрашивает только GridPhysicsEngine, а он работает с ленивым батчем
+        if self.lazy and self.velocity.any():
+            self.reindex()
+
+    def turn(self):
+        """Turn around the platforms that reached the end of their range and set the velocity for the next tick."""
+        # Меняем направление, если вышли за пределы движения
+        turned = (np.abs(self.position - self.start_coords) >= self.range[:, None]) & (self.direction != 0)
+        self.direction[turned] *= -1
+
+        velocity = self.speed[:, None] * self.direction
+        changed = np.flatnonzero((velocity != self.velocity).any(axis=1))
+        if changed.size:
+            sprites = self.sprites
+            for i, (change_x, change_y) in zip(changed.tolist(), velocity[changed].tolist()):
+                sprite = sprites[i]
+                sprite.change_x = change_x
+                sprite.change_y = change_y
+        self.velocity = velocity
+
+    def update(self):
+        """Call after the physics engine has moved the platforms for this tick."""
+        self.advance()
+        self.turn()
+
+    def _write(self, numbers):
+        """Write the positions of the given platforms to the sprites that are behind (lazy mode)."""
+        if not self.lazy or not numbers:
+            return
+        numbers = np.asarray(numbers)
+        stale = numbers[(self.position[numbers] != self.written[numbers]).any(axis=1)]
+        if stale.size:
+            sprites = self.sprites
+            for i, position in zip(stale.tolist(), self.position[stale].tolist()):
+                sprites[i].position = tuple(position)
+            self.written[stale] = self.position[stale]
+
+    def query(self, left, right, bottom, top):
+        """Sprites of the platforms whose grid cells overlap the box, at their current positions."""
+        numbers = self.index.query(left, right, bottom, top)
+        self._write(numbers)
+        sprites = self.sprites
+        return [sprites[i] for i in numbers]
+
+    def sync(self, left, right, bottom, top):
+        """Bring the sprites within the box up to date (for drawing)."""
+        self._write(self.index.query(left, right, bottom, top))
+
+    def sync_all(self):
+        self._write(range(len(self.objects)))
@@ -0,0 +1,434 @@
+"""Compiled level cache.
+
+A Tiled map (.json or .tmx) is compiled once into a binary file with the
+tile GID arrays of every tile layer, the spawn table of every object
+layer (shapes already in world coordinates) and the collision rectangles
+of the solid layers. Later loads map the file into memory and read the
+arrays without parsing or copying them.
+
+The cache file name contains a hash of the map, so editing the map
+compiles it again. Tilesets referenced by the map are checked by their own
+hashes stored in the file.
+
+load_tilemap() returns an object with the parts of arcade.TileMap that
+create_scene uses (sprite_lists, object_lists, sizes, background color).
+Maps with features the compiler does not support (animated tiles, image
+collection tilesets, tile collision shapes) are loaded by
+arcade.load_tilemap as before.
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+from collections import namedtuple
+from pathlib import Path
+
+import arcade
+import pytiled_parser
+
+
+CACHE_DIR = '.levelcache'
+# Сколько последних использованных файлов каждого вида (.lvl, .nav) остаётся в каталоге кэша
+CACHE_KEEP = 32
+MAGIC = b'LEVEL\0\0\0'
+VERSION = 1
+# magic, version, длина JSON-заголовка
+HEADER = struct.Struct('<8sII')
+# Слои, тайлы которых сливаются в прямоугольники столкновений
+COLLISION_LAYERS = ('objects',)
+
+FLIPPED_HORIZONTALLY = 0x80000000
+FLIPPED_VERTICALLY = 0x40000000
+FLIPPED_DIAGONALLY = 0x20000000
+GID_MASK = 0x1FFFFFFF
+
+# Объект слоя объектов: shape и properties как у объектов arcade.TileMap.object_lists
+LevelObject = namedtuple('LevelObject', 'shape properties')
+
+STATS = {
+    'compiles': 0,
+    'cache_hits': 0,
+    'fallbacks': 0,
+}
+
+
+class UnsupportedMap(Exception):
+    pass
+
+
+def _file_hash(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def source_hash(map_path, scaling):
+    digest = hashlib.sha1(f'{VERSION}:{scaling!r}:'.encode())
+    with open(map_path, 'rb') as f:
+        digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def cache_path(map_path, scaling):
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    return os.path.join(CACHE_DIR, f'{name}-{source_hash(map_path, scaling)}.lvl')
+
+
+def touch(path):
+    """Mark a cache file as just used, so prune() removes it last."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def prune(extension, keep=CACHE_KEEP):
+    """Remove all but the keep most recently used <name>-<hash>.<extension> files of the cache."""
+    pattern = re.compile(rf'.+-[0-9a-f]{{16}}\.{re.escape(extension)}')
+    try:
+        names = [name for name in os.listdir(CACHE_DIR) if pattern.fullmatch(name)]
+    except OSError:
+        return
+    used = []
+    for name in names:
+        path = os.path.join(CACHE_DIR, name)
+        try:
+            used.append((os.path.getmtime(path), path))
+        except OSError:
+            pass
+    used.sort(reverse=True)
+    for _, path in used[keep:]:
+        try:
+            os.remove(path)
+        except OSError:  # файл ещё открыт (под Windows его нельзя удалить) - удалится в следующий раз
+            pass
+
+
+def _tileset_sources(map_path):
+    """Paths of the external tilesets the map refers to."""
+    directory = os.path.dirname(map_path)
+    if map_path.endswith('.json'):
+        with open(map_path) as f:
+            sources = [tileset['source'] for tileset in json.load(f).get('tilesets', ()) if 'source' in tileset]
+    else:
+        with open(map_path) as f:
+            sources = re.findall(r'<tileset[^>]*\ssource="([^"]+)"', f.read())
+    return [os.path.normpath(os.path.join(directory, source)) for source in sources]
+
+
+def _align(blob):
+    blob.extend(b'\0' * (-len(blob) % 8))
+
+
+def _merge_rects(gids, width, height, tile_width, tile_height, scaling):
+    """Solid tiles merged into rectangles: runs in each row, then equal runs of neighbouring rows."""
+    open_rects = {}
+    rects = []
+    for row in range(height):
+        runs = []
+        col = 0
+        while col < width:
+            if gids[row * width + col]:
+                start = col
+                while col < width and gids[row * width + col]:
+                    col += 1
+                runs.append((start, col))
+            else:
+                col += 1
+        still_open = {}
+        for run in runs:
+            rect = open_rects.pop(run, None)
+            still_open[run] = [run[0], run[1], rect[2] if rect else row, row + 1]
+        rects.extend(open_rects.values())
+        open_rects = still_open
+    rects.extend(open_rects.values())
+
+    # Строки Tiled идут сверху вниз, в мире y растёт вверх
+    result = []
+    for col0, col1, row0, row1 in rects:
+        result.extend((
+            col0 * tile_width * scaling, col1 * tile_width * scaling,
+            (height - row1) * tile_height * scaling, (height - row0) * tile_height * scaling,
+        ))
+    return result
+
+
+def _shape(tiled_object, map_height, scaling):
+    """Object shape in world coordinates, the same way arcade.TileMap computes it."""
+    x = tiled_object.coordinates.x * scaling
+    y = (map_height - tiled_object.coordinates.y) * scaling
+    if isinstance(tiled_object, pytiled_parser.tiled_object.Point):
+        return [(x, y)]
+    if isinstance(tiled_object, pytiled_parser.tiled_object.Rectangle):
+        if tiled_object.size.width == 0 and tiled_object.size.height == 0:
+            return [(x, y)]
+        ex = x + tiled_object.size.width * scaling
+        ey = y - tiled_object.size.height * scaling
+        return [(x, y), (ex, y), (ex, ey), (x, ey)]
+    raise UnsupportedMap(f'object {tiled_object.id} is a {type(tiled_object).__name__}')
+
+
+def _json_value(value):
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def compile_level(map_path, scaling, output):
+    """Parse the map with pytiled_parser and write the compiled level to output."""
+    tiled_map = pytiled_parser.parse_map(Path(map_path))
+    if tiled_map.infinite:
+        raise UnsupportedMap('infinite maps are not supported')
+
+    map_directory = os.path.dirname(os.path.abspath(map_path))
+    tilesets = []
+    # Внешние тайлсеты (.tsx) могут измениться независимо от карты
+    dependencies = {path: _file_hash(path) for path in _tileset_sources(map_path)}
+    for firstgid, tileset in tiled_map.tilesets.items():
+        if tileset.image is None or tileset.tiles:
+            raise UnsupportedMap(f'tileset {tileset.name} has per-tile data')
+        image = str(tileset.image)
+        if not os.path.exists(image):
+            image = os.path.join(map_directory, image)
+        tilesets.append({
+            'firstgid': firstgid, 'image': image, 'columns': tileset.columns,
+            'tile_count': tileset.tile_count, 'tile_width': tileset.tile_width,
+            'tile_height': tileset.tile_height, 'margin': tileset.margin or 0, 'spacing': tileset.spacing or 0,
+        })
+
+    width, height = tiled_map.map_size.width, tiled_map.map_size.height
+    tile_width, tile_height = tiled_map.tile_size.width, tiled_map.tile_size.height
+    header = {
+        'width': width, 'height': height, 'tile_width': tile_width, 'tile_height': tile_height,
+        'scaling': scaling, 'background_color': list(tiled_map.background_color or ()) or None,
+        'tilesets': tilesets, 'dependencies': dependencies, 'layers': [], 'collision': None,
+    }
+    blob = bytearray()
+    collision = []
+    for layer in tiled_map.layers:
+        if isinstance(layer, pytiled_parser.TileLayer):
+            gids = [gid for row in layer.data for gid in row]
+            header['layers'].append({
+                'name': layer.name, 'type': 'tiles', 'offset': len(blob), 'count': len(gids),
+                'visible': layer.visible, 'opacity': layer.opacity,
+            })
+            blob.extend(struct.pack(f'<{len(gids)}I', *gids))
+            _align(blob)
+            if layer.name in COLLISION_LAYERS:
+                collision.extend(_merge_rects(gids, width, height, tile_width, tile_height, scaling))
+        elif isinstance(layer, pytiled_parser.ObjectLayer):
+            # Таблица появления: для каждого объекта 4 точки формы (у точки - одна, остальные повторяют её)
+            points = []
+            sizes = []
+            properties = []
+            for tiled_object in layer.tiled_objects:
+                if isinstance(tiled_object, pytiled_parser.tiled_object.Tile):
+                    raise UnsupportedMap(f'tile object {tiled_object.id} in layer {layer.name}')
+                shape = _shape(tiled_object, height * tile_height, scaling)
+                sizes.append(len(shape))
+                for point in (shape * 4)[:4]:
+                    points.extend(point)
+                properties.append({key: _json_value(value) for key, value in (tiled_object.properties or {}).items()})
+            header['layers'].append({
+                'name': layer.name, 'type': 'objects', 'offset': len(blob), 'count': len(sizes),
+                'sizes': sizes, 'properties': properties,
+            })
+            blob.extend(struct.pack(f'<{len(points)}d', *points))
+            _align(blob)
+        else:
+            raise UnsupportedMap(f'layer {layer.name} is a {type(layer).__name__}')
+
+    header['collision'] = {'offset': len(blob), 'count': len(collision) // 4}
+    blob.extend(struct.pack(f'<{len(collision)}d', *collision))
+
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b' ' * (-(HEADER.size + len(header_bytes)) % 8)
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    tmp = output + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        f.write(blob)
+    os.replace(tmp, output)
+    STATS['compiles'] += 1
+
+
+class Level:
+    """A compiled level read through a memory map."""
+
+    def __init__(self, path, layer_options=None):
+        with open(path, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_size = HEADER.unpack_from(self.mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a compiled level of version {VERSION}')
+        self.header = json.loads(self.mmap[HEADER.size:HEADER.size + header_size])
+        self.data = memoryview(self.mmap)[HEADER.size + header_size:]
+
+        header = self.header
+        self.width = header['width']
+        self.height = header['height']
+        self.tile_width = header['tile_width']
+        self.tile_height = header['tile_height']
+        self.scaling = header['scaling']
+        color = header['background_color']
+        self.background_color = arcade.types.Color(*color) if color else None
+        self.layer_options = layer_options or {}
+
+        self.sprite_lists = {}
+        self.object_lists = {}
+        self.tiles = {}
+
+    def build(self, streamed=()):
+        """Create the tile sprites (except for the streamed layers) and read the object layers."""
+        for layer in self.header['layers']:
+            if layer['type'] == 'tiles':
+                self.sprite_lists[layer['name']] = self.create_tile_layer(layer, layer['name'] in streamed)
+            else:
+                self.object_lists[layer['name']] = self.read_objects(layer)
+        return self
+
+    def close(self):
+        self.data.release()
+        self.mmap.close()
+
+    def dependencies_changed(self):
+        for path, digest in self.header['dependencies'].items():
+            if not os.path.exists(path) or _file_hash(path) != digest:
+                return True
+        return False
+
+    def gids(self, name):
+        """Tile GIDs of a tile layer, row by row from the top (a view into the file, not a copy)."""
+        for layer in self.header['layers']:
+            if layer['name'] == name and layer['type'] == 'tiles':
+                return self.data[layer['offset']:layer['offset'] + layer['count'] * 4].cast('I')
+        raise KeyError(name)
+
+    @property
+    def collision_rects(self):
+        """Flat (left, right, bottom, top, ...) rectangles of the solid tiles."""
+        collision = self.header['collision']
+        return self.data[collision['offset']:collision['offset'] + collision['count'] * 32].cast('d')
+
+    def tile(self, gid):
+        """Texture and tileset-local id of a tile."""
+        tile = self.tiles.get(gid)
+        if tile is not None:
+            return tile
+
+        tile_gid = gid & GID_MASK
+        for tileset in reversed(self.header['tilesets']):
+            if tile_gid >= tileset['firstgid']:
+                break
+        tile_id = tile_gid - tileset['firstgid']
+        if tile_id >= tileset['tile_count']:
+            raise ValueError(f'no tile for gid {tile_gid}')
+        row, col = divmod(tile_id, tileset['columns'])
+        # Тот же кэш и те же аргументы, что у arcade.TileMap: текстуры общие с остальной игрой
+        texture = arcade.texture.default_texture_cache.load_or_get_texture(
+            tileset['image'],
+            x=tileset['margin'] + col * (tileset['tile_width'] + tileset['spacing']),
+            y=tileset['margin'] + row * (tileset['tile_height'] + tileset['spacing']),
+            width=tileset['tile_width'],
+            height=tileset['tile_height'],
+        )
+        if gid & FLIPPED_DIAGONALLY:
+            texture = texture.flip_diagonally()
+        if gid & FLIPPED_HORIZONTALLY:
+            texture = texture.flip_horizontally()
+        if gid & FLIPPED_VERTICALLY:
+            texture = texture.flip_vertically()
+        tile = self.tiles[gid] = (texture, tile_id)
+        return tile
+
+    def layer(self, name):
+        for layer in self.header['layers']:
+            if layer['name'] == name:
+                return layer
+        raise KeyError(name)
+
+    def create_tile_layer(self, layer, streamed=False):
+        """SpriteList of a tile layer; a streamed layer starts empty and is filled by chunks."""
+        options = self.layer_options.get(layer['name'], {})
+        sprite_list = arcade.SpriteList(use_spatial_hash=options.get('use_spatial_hash', False))
+        sprite_list.visible = layer['visible']
+        if not streamed:
+            sprite_list.extend(self.create_tiles(layer['name'], 0, self.width, 0, self.height))
+        return sprite_list
+
+    def create_tiles(self, name, col0, col1, row0, row1):
+        """Sprites of the tiles in columns col0..col1-1 and rows row0..row1-1 (rows from the top)."""
+        layer = self.layer(name)
+        alpha = int(layer['opacity'] * 255) if layer['opacity'] else 255
+        gids = self.gids(name)
+
+        scaling = self.scaling
+        step_x = self.tile_width * scaling
+        step_y = self.tile_height * scaling
+        width = self.width
+        top_row = self.height - 1
+        sprites = []
+        # gid -> (текстура, id тайла, половина ширины и высоты спрайта)
+        tiles = {}
+        for row in range(row0, row1):
+            for col in range(col0, col1):
+                gid = gids[row * width + col]
+                if not gid:
+                    continue
+                tile = tiles.get(gid)
+                if tile is None:
+                    texture, tile_id = self.tile(gid)
+                    tile = tiles[gid] = (texture, tile_id, texture.width * scaling / 2, texture.height * scaling / 2)
+                texture, tile_id, half_width, half_height = tile
+                sprite = arcade.Sprite(
+                    texture, scale=scaling,
+                    center_x=col * step_x + half_width, center_y=(top_row - row) * step_y + half_height,
+                )
+                if alpha != 255:
+                    sprite.alpha = alpha
+                sprite.properties['tile_id'] = tile_id
+                sprites.append(sprite)
+        return sprites
+
+    def read_objects(self, layer):
+        points = self.data[layer['offset']:layer['offset'] + layer['count'] * 64].cast('d')
+        objects = []
+        for i, (size, properties) in enumerate(zip(layer['sizes'], layer['properties'])):
+            corners = [(points[i * 8 + j * 2], points[i * 8 + j * 2 + 1]) for j in range(size)]
+            # Точка в arcade - это просто (x, y), а не список точек
+            shape = corners[0] if size == 1 else corners
+            objects.append(LevelObject(shape, properties))
+        return objects
+
+
+def load_level(map_path, scaling, layer_options=None, streamed=()):
+    """Load the compiled level, compiling the map first if there is no fresh cache."""
+    path = cache_path(map_path, scaling)
+    if os.path.exists(path):
+        level = Level(path, layer_options)
+        if not level.dependencies_changed():
+            STATS['cache_hits'] += 1
+            touch(path)
+            return level.build(streamed)
+        level.close()
+
+    compile_level(map_path, scaling, path)
+    # Кэш не растёт без конца: старые версии карт уходят первыми
+    prune('lvl')
+    return Level(path, layer_options).build(streamed)
+
+
+def load_tilemap(map_path, scaling=1.0, layer_options=None, streamed=()):
+    """
+    Drop-in for arcade.load_tilemap that goes through the compiled cache.
+
+    Tile layers named in streamed are left empty for chunks.ChunkStreamer
+    (the arcade fallback always loads them whole).
+    """
+    try:
+        return load_level(map_path, scaling, layer_options, streamed)
+    except UnsupportedMap:
+        STATS['fallbacks'] += 1
+        return arcade.load_tilemap(map_path, scaling=scaling, layer_options=layer_options)
@@ -0,0 +1,169 @@
+"""Generator of Tiled maps in the same format as map.json.
+
+Used to build large levels for benchmarks and stress tests
+(benchmarks/, bench.py). From the command line:
+
+    python levelgen.py OUTPUT [--width N] [--mobs N] [--platforms N] [--blocks N]
+                              [--artifact COL] [--portal COL] [--seed N]
+"""
+import argparse
+import json
+import os
+import random
+
+
+TILE_SIZE = 223
+TILESET_COLUMNS = 27
+TILESET_ROWS = 13
+GROUND_ROW = TILESET_ROWS - 1
+
+
+def _prop(name, type_, value):
+    return {"name": name, "type": type_, "value": value}
+
+
+def _object(object_id, x, y, width, height, properties=()):
+    obj = {
+        "height": height, "id": object_id, "name": "", "rotation": 0,
+        "type": "", "visible": True, "width": width, "x": x, "y": y,
+    }
+    if properties:
+        obj["properties"] = list(properties)
+    return obj
+
+
+def _layer(layer_id, name, objects):
+    return {
+        "draworder": "topdown", "id": layer_id, "name": name, "objects": objects,
+        "opacity": 1, "type": "objectgroup", "visible": True, "x": 0, "y": 0,
+    }
+
+
+def generate(width=27, height=TILESET_ROWS, mobs=2, platforms=6, seed=0, blocks=0, artifact=1, portal=None):
+    """
+    Build a map dict with the layers create_scene expects.
+
+    blocks - raised blocks of ground (1-3 tiles high) on the objects layer; artifact and
+    portal - tile columns of the artifact and the portal (None - two tiles from the right edge).
+    The wall stands one tile left of the portal. Mobs are not placed on blocks.
+    """
+    rnd = random.Random(seed)
+    next_id = 1
+    if portal is None:
+        portal = width - 2
+
+    # Фон повторяет картинку тайлсета, нижний ряд слоя objects - земля
+    background = []
+    objects = []
+    for row in range(height):
+        tileset_row = min(row, GROUND_ROW - 1)
+        for col in range(width):
+            background.append(tileset_row * TILESET_COLUMNS + col % TILESET_COLUMNS + 1)
+            if row == height - 1:
+                objects.append(GROUND_ROW * TILESET_COLUMNS + col % TILESET_COLUMNS + 1)
+            else:
+                objects.append(0)
+
+    # Блоки не ставятся у старта игрока, артефакта, стены и портала
+    raised = set()
+    reserved = set(range(4)) | {artifact, portal - 1, portal}
+    for _ in range(blocks):
+        block_width = rnd.randint(1, 4)
+        col = rnd.randint(4, max(4, width - block_width - 1))
+        columns = range(col, min(col + block_width, width))
+        if reserved.intersection(columns):
+            continue
+        block_height = rnd.randint(1, 3)
+        for col in columns:
+            raised.add(col)
+            for row in range(height - 1 - block_height, height - 1):
+                objects[row * width + col] = GROUND_ROW * TILESET_COLUMNS + col % TILESET_COLUMNS + 1
+
+    ground_y = (height - 1) * TILE_SIZE
+    level_width = width * TILE_SIZE
+
+    platform_objects = []
+    for _ in range(platforms):
+        x = rnd.uniform(TILE_SIZE * 2, level_width - TILE_SIZE * 2)
+        y = rnd.uniform(ground_y - TILE_SIZE * 6, ground_y - TILE_SIZE * 2)
+        platform_objects.append(_object(next_id, x, y, 215.988, 229.487, (
+            _prop("direction", "int", -1),
+            _prop("image", "string", "assets/sprites/platform.png"),
+            _prop("range", "int", rnd.randint(30, 300)),
+            _prop("speed", "float", round(rnd.uniform(0.2, 1.4), 2)),
+        )))
+        next_id += 1
+
+    mob_objects = []
+    for i in range(mobs):
+        # Первый моб стоит на месте (Mob2), остальные патрулируют (Mob1)
+        direction = 0 if i == 0 else rnd.choice((-1, 1))
+        x = rnd.uniform(TILE_SIZE * 4, level_width - TILE_SIZE * 2)
+        # Моб шириной в тайл не должен стоять внутри блока; на очень тесной карте - где получится
+        for _ in range(20):
+            if not raised.intersection((int(x // TILE_SIZE), int((x + 232) // TILE_SIZE))):
+                break
+            x = rnd.uniform(TILE_SIZE * 4, level_width - TILE_SIZE * 2)
+        mob_objects.append(_object(next_id, x, ground_y - 240, 232, 240, (
+            _prop("direction", "int", direction),
+            _prop("range", "int", 0 if direction == 0 else rnd.randint(100, 400)),
+            _prop("speed", "float", 0 if direction == 0 else 1),
+        )))
+        next_id += 1
+
+    artifact = _object(next_id, artifact * TILE_SIZE, ground_y - 246.326, 213.038, 246.326)
+    wall = _object(next_id + 2, (portal - 1) * TILE_SIZE, ground_y - 1224.24, 657.576, 1224.24)
+    portal = _object(next_id + 1, portal * TILE_SIZE, ground_y - 957.576, 242.424, 957.576)
+    next_id += 3
+
+    return {
+        "compressionlevel": -1, "height": height, "infinite": False,
+        "layers": [
+            {"data": background, "height": height, "id": 1, "name": "baground", "opacity": 1,
+             "type": "tilelayer", "visible": True, "width": width, "x": 0, "y": 0},
+            {"data": objects, "height": height, "id": 2, "name": "objects", "opacity": 1,
+             "type": "tilelayer", "visible": True, "width": width, "x": 0, "y": 0},
+            _layer(3, "objects2", platform_objects),
+            _layer(4, "mobs", mob_objects),
+            _layer(5, "artifact", [artifact]),
+            _layer(6, "portal", [portal]),
+            _layer(8, "wall", [wall]),
+        ],
+        "nextlayerid": 9, "nextobjectid": next_id, "orientation": "orthogonal",
+        "renderorder": "right-down", "tiledversion": "1.11.2",
+        "tileheight": TILE_SIZE, "tilewidth": TILE_SIZE, "type": "map", "version": "1.10",
+        "width": width,
+        "tilesets": [{"firstgid": 1, "source": "tiles.tsx"}],
+    }
+
+
+def write(path, **kwargs):
+    """Generate a map and save it as Tiled JSON; returns the path."""
+    tile_map = generate(**kwargs)
+    # Путь к тайлсету должен быть относительным к файлу карты
+    tileset = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiles.tsx")
+    tile_map["tilesets"][0]["source"] = os.path.relpath(tileset, os.path.dirname(os.path.abspath(path)))
+    with open(path, "w") as f:
+        json.dump(tile_map, f)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a Tiled map for stress tests')
+    parser.add_argument('output')
+    parser.add_argument('--width', type=int, default=27, help='tiles')
+    parser.add_argument('--mobs', type=int, default=2)
+    parser.add_argument('--platforms', type=int, default=6)
+    parser.add_argument('--blocks', type=int, default=0, help='raised blocks of ground')
+    parser.add_argument('--artifact', type=int, default=1, help='tile column of the artifact')
+    parser.add_argument('--portal', type=int, default=None, help='tile column of the portal')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(write(
+        args.output, width=args.width, mobs=args.mobs, platforms=args.platforms, seed=args.seed,
+        blocks=args.blocks, artifact=args.artifact, portal=args.portal,
+    ))
+
+
+if __name__ == '__main__':
+    main()
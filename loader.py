@@ -0,0 +1,153 @@
+"""Background asset loading.
+
+Images and sounds are read and decoded by a thread pool. The main thread
+only puts finished textures into the shared cache (textures.py) and
+uploads them to the GPU atlas, a few per frame, so the window stays
+responsive while the game loads.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import arcade
+
+import sounds
+import textures
+from Obj import all_animations
+
+
+# Картинки, из которых спрайты создаются напрямую (не через Animation)
+IMAGES = [
+    'assets/sprites/Blood.png',
+    'assets/sprites/hint.png',
+    'assets/sprites/platform.png',
+    'assets/sprites/stone.png',
+    'assets/sprites/missing.png',
+]
+
+# Звуки, нужные уже в первом кадре игры; остальные загружаются в фоне во время игры
+STARTUP_SOUNDS = ('background_sound',)
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+class AssetLoader:
+    def __init__(self, workers=4, upload=True):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix='assets')
+        self.upload = upload
+        self.jobs = []
+        self.animations = []
+        self.keys = set()
+        self.done = 0
+        # имя ассета -> [время декодирования в потоке, время доработки в главном потоке]
+        self.timings = {}
+        self.errors = {}
+
+    def add_frame(self, path, reverse=False, upscale=1):
+        key = (path, reverse, upscale)
+        if key in self.keys or key in textures.FRAMES:
+            return
+        self.keys.add(key)
+        self.jobs.append(('frame', key, self.pool.submit(_timed, textures.decode_frame, path)))
+
+    def add_animation(self, filepath, length, reverse=False, upscale=1):
+        for path in textures.frame_paths(filepath, length):
+            self.add_frame(path, reverse, upscale)
+        self.animations.append((filepath, length, reverse, upscale))
+
+    def add_sound(self, name):
+        if name in self.keys or name in sounds.LOADED_SOUNDS:
+            return
+        self.keys.add(name)
+        self.jobs.append(('sound', name, self.pool.submit(_timed, arcade.load_sound, sounds.SOUNDS[name])))
+
+    def add_game_assets(self):
+        """Queue what the game needs for the first frame of GameView."""
+        for spec in all_animations():
+            self.add_animation(*spec)
+        for path in IMAGES:
+            self.add_frame(path)
+        for name in STARTUP_SOUNDS:
+            self.add_sound(name)
+
+    def add_deferred_assets(self):
+        """Queue the assets that may arrive after the game has started (sounds decode on first use anyway)."""
+        for name in sounds.SOUNDS:
+            self.add_sound(name)
+
+    @property
+    def total(self):
+        return len(self.jobs)
+
+    @property
+    def progress(self):
+        return self.done / self.total if self.jobs else 1.0
+
+    def finished(self):
+        return self.done == self.total
+
+    def poll(self, budget=0.008):
+        """
+        Finish decoded assets on the main thread for up to budget seconds.
+
+        Returns True when everything is loaded.
+        """
+        start = time.perf_counter()
+        while self.done < self.total and time.perf_counter() - start < budget:
+            kind, key, future = self.jobs[self.done]
+            if not future.done():
+                break
+            self.done += 1
+            name = key[0] if kind == 'frame' else key
+            try:
+                result, decode_time = future.result()
+            except Exception as error:  # отсутствующий файл не должен останавливать загрузку остального
+                self.errors[name] = error
+                continue
+
+            finish = time.perf_counter()
+            if kind == 'frame':
+                pair = textures.add_frame(key[0], result, *key[1:])
+                if self.upload:
+                    # Загрузка в атлас (GPU) возможна только в главном потоке
+                    atlas = arcade.get_window().ctx.default_atlas
+                    for texture in pair:
+                        atlas.add(texture)
+            elif key not in sounds.LOADED_SOUNDS:
+                # Звук, запущенный до окончания фоновой загрузки, уже декодирован get_sound
+                sounds.add_sound(key, result, decode_time)
+            self.timings[name] = [decode_time, time.perf_counter() - finish]
+
+        if self.finished():
+            for spec in self.animations:
+                textures.load_animation(*spec)
+            self.animations.clear()
+            textures.unload_atlas_pages()
+            self.pool.shutdown(wait=False)
+            return True
+        return False
+
+    def wait(self):
+        """Load everything, blocking (headless runs and benchmarks)."""
+        while not self.poll(budget=1.0):
+            time.sleep(0.001)
+
+    def report(self):
+        """Per-asset load cost, most expensive first: [(name, decode_s, finish_s), ...]."""
+        rows = [(name, decode, finish) for name, (decode, finish) in self.timings.items()]
+        rows.sort(key=lambda row: row[1] + row[2], reverse=True)
+        return rows
+
+    def print_report(self, limit=15):
+        rows = self.report()
+        decode = sum(row[1] for row in rows)
+        finish = sum(row[2] for row in rows)
+        print(f'{len(rows)} assets: decode {decode * 1000:.1f} ms (worker threads), '
+              f'finish {finish * 1000:.1f} ms (main thread)')
+        for name, decode, finish in rows[:limit]:
+            print(f'  {decode * 1000:8.2f} {finish * 1000:8.2f} ms  {name}')
+        for name, error in self.errors.items():
+            print(f'  failed: {name}: {error}')
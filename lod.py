@@ -0,0 +1,86 @@
+"""Update level of detail: which entities of the world run each tick.
+
+Entities are binned once, by the area their patrol can reach, into a
+coarse grid, so finding the ones around the view is a grid query
+whatever the size of the level:
+
+    near   view + near margin: AI and animation every tick
+    mid    view + far margin: AI every `interval` ticks (entities take
+           turns), no animation - they are off screen
+    far    everything else sleeps
+
+A skipped entity catches up when it runs again: systems.patrol_system
+makes the patrol steps it missed, and animations follow the global clock
+anyway. So positions, frames and AI state come out the same as with
+every entity updated every tick, and a replay does not depend on where
+the camera was. An entity playing a one-shot animation (attack, death,
+...) runs at full rate wherever it is, so the animation ends on time,
+and so does an aggro mob: it chases the player (systems.chase_system)
+and leaves the area it was binned by.
+"""
+from broadphase import SpatialGrid
+
+
+STATS = {
+    'near': 0,
+    'awake': 0,
+    'asleep': 0,
+}
+
+
+class UpdateScheduler:
+    def __init__(self, world, near_margin, far_margin, interval, cell_size):
+        self.world = world
+        self.near_margin = near_margin
+        self.far_margin = far_margin
+        self.interval = interval
+        self.grid = SpatialGrid(cell_size)
+        # Сущности с одноразовой анимацией и агрессивные мобы - обновляются каждый тик, где бы ни были
+        self.busy = set()
+        self.brains = world.stores.get('brain', {})
+
+        for entity, proxy in enumerate(world.proxies):
+            patrol = world.get(entity, 'patrol')
+            reach = proxy.width / 2
+            if patrol is not None:
+                reach += patrol.range + abs(patrol.speed) * 3
+            x = patrol.start_x if patrol is not None else proxy.center_x
+            self.grid.update(
+                entity, x - reach, x + reach, proxy.center_y - proxy.height / 2, proxy.center_y + proxy.height / 2,
+            )
+
+    def schedule(self, tick, left, right, bottom, top):
+        """Entities to update this tick around the view box: (AI, animation), both sorted."""
+        margin = self.near_margin
+        near = set(self.grid.query(left - margin, right + margin, bottom - margin, top + margin))
+        margin = self.far_margin
+        nearby = self.grid.query(left - margin, right + margin, bottom - margin, top + margin)
+
+        interval = self.interval
+        awake = near | self.busy
+        for entity in nearby:
+            # Сущности средней дальности обновляются по очереди, каждая раз в interval тиков
+            if (tick + entity) % interval == 0:
+                awake.add(entity)
+        animated = near | self.busy
+
+        STATS['near'] = len(near)
+        STATS['awake'] = len(awake)
+        STATS['asleep'] = len(self.world) - len(awake)
+        return sorted(awake), sorted(animated)
+
+    def track(self, animated):
+        """After the animation system: remember which entities are in a one-shot animation or aggro."""
+        proxies = self.world.proxies
+        brains = self.brains
+        busy = self.busy
+        for entity in animated:
+            proxy = proxies[entity]
+            brain = brains.get(entity)
+            if proxy.now_texture.stop or brain is not None and brain.is_aggro and proxy.alive:
+                busy.add(entity)
+            else:
+                busy.discard(entity)
+
+    def reset(self):
+        self.busy.clear()
@@ -0,0 +1,260 @@
+"""Navigation grid and flow fields for chasing mobs.
+
+The level is cut into the cells of the tile grid. A cell is a node when
+a mob can stand in it: the cell is free and the one under it is solid.
+Solid cells are those of the physics (a tile of the "objects" layer);
+"wall" objects are scenery the player walks through, so they are free
+here too. Nodes are linked by
+
+    walk   to the node next to it in the same row
+    drop   off a ledge, to the first node below in the next column
+    jump   to a node up to jump_rows higher and jump_columns away,
+           through free cells
+
+The graph is built once per map and stored next to the compiled level
+(.levelcache/<map>-<hash>.nav), so later loads only read its arrays.
+
+A flow field gives, for every node within a path cost of radius from
+the player's node, the next node toward it. It is searched only when the
+player has got to another node and a mob asks for it, and the last
+fields are kept by their target, so a player walking back and forth
+reuses them. All chasing
+mobs read the same field: one lookup per mob per tick, whatever their
+number.
+"""
+import heapq
+import math
+import os
+import struct
+from array import array
+from collections import OrderedDict
+
+import levelcache
+from gridphysics import SolidGrid
+
+
+MAGIC = b'NAVGRID\0'
+VERSION = 2
+# magic, version, ширина и высота в клетках, размеры клетки, число узлов и связей, прыжок (строк, столбцов)
+HEADER = struct.Struct('<8sIIIddIIII')
+
+# Стоимость прыжка сверх пройденных клеток: по ровному месту мобы идут, а не прыгают
+JUMP_COST = 2
+
+STATS = {
+    'builds': 0,
+    'cache_hits': 0,
+    'searches': 0,
+}
+
+
+class NavGrid:
+    def __init__(self, width, height, cell_width, cell_height, jump_rows, jump_columns):
+        self.width = width
+        self.height = height
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.jump_rows = jump_rows
+        self.jump_columns = jump_columns
+        # Номер клетки (row * width + col, строки снизу) каждого узла
+        self.cells = array('I')
+        # Входящие связи узлов: источники и стоимости узла b - sources[offsets[b]:offsets[b + 1]]
+        self.offsets = array('I', [0])
+        self.sources = array('I')
+        self.costs = array('H')
+        self.node_of = {}
+
+    @classmethod
+    def build(cls, solid, jump_rows=2, jump_columns=2):
+        """Graph of a SolidGrid (the one the physics collides with)."""
+        width, height = solid.width, solid.height
+        grid = cls(width, height, solid.cell_width, solid.cell_height, jump_rows, jump_columns)
+        blocked = solid.cells
+
+        def free(col, row):
+            # За краями уровня стен нет, но и стоять там не на чем
+            return 0 <= col < width and (row >= height or row >= 0 and not blocked[row * width + col])
+
+        node_of = grid.node_of
+        for row in range(1, height):
+            for col in range(width):
+                cell = row * width + col
+                if not blocked[cell] and blocked[cell - width]:
+                    node_of[cell] = len(grid.cells)
+                    grid.cells.append(cell)
+
+        incoming = [[] for _ in grid.cells]
+        for node, cell in enumerate(grid.cells):
+            row, col = divmod(cell, width)
+            for step in (-1, 1):
+                side = col + step
+                if not free(side, row):
+                    continue
+                target = node_of.get(row * width + side)
+                if target is not None:
+                    incoming[target].append((node, 1))
+                    continue
+                # Обрыв: падение до первого узла в соседнем столбце
+                below = row - 1
+                while below >= 1 and free(side, below) and (below * width + side) not in node_of:
+                    below -= 1
+                target = node_of.get(below * width + side)
+                if target is not None:
+                    incoming[target].append((node, 1 + row - below))
+
+            for rise in range(jump_rows + 1):
+                # Над стартом должно быть свободно на всю высоту прыжка
+                if not all(free(col, row + k) for k in range(1, rise + 1)):
+                    break
+                for distance in range(1, jump_columns + 1):
+                    for step in (-1, 1):
+                        side = col + step * distance
+                        target = node_of.get((row + rise) * width + side) if 0 <= side < width else None
+                        if target is None or rise == 0 and distance == 1:
+                            continue
+                        # Путь по верху прыжка тоже свободен
+                        if all(free(col + step * k, row + rise) for k in range(1, distance + 1)):
+                            incoming[target].append((node, rise + distance + JUMP_COST))
+
+        for links in incoming:
+            for source, cost in links:
+                grid.sources.append(source)
+                grid.costs.append(cost)
+            grid.offsets.append(len(grid.sources))
+        STATS['builds'] += 1
+        return grid
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(HEADER.pack(
+                MAGIC, VERSION, self.width, self.height, self.cell_width, self.cell_height,
+                len(self.cells), len(self.sources), self.jump_rows, self.jump_columns,
+            ))
+            for data in (self.cells, self.offsets, self.sources, self.costs):
+                data.tofile(f)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        magic, version, width, height, cell_width, cell_height, nodes, links, jump_rows, jump_columns = \
+            HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a navigation grid of version {VERSION}')
+        grid = cls(width, height, cell_width, cell_height, jump_rows, jump_columns)
+        position = HEADER.size
+        grid.offsets = array('I')
+        for name, count in (('cells', nodes), ('offsets', nodes + 1), ('sources', links), ('costs', links)):
+            values = getattr(grid, name)
+            size = values.itemsize * count
+            values.frombytes(data[position:position + size])
+            position += size
+        grid.node_of = {cell: node for node, cell in enumerate(grid.cells)}
+        return grid
+
+    def node_below(self, x, y, depth=2):
+        """Node of the cell at (x, y), or of the first one up to depth cells under it; None if there is none."""
+        col = math.floor(x / self.cell_width)
+        row = math.floor(y / self.cell_height + 1e-6)
+        if not 0 <= col < self.width:
+            return None
+        for row in range(min(row, self.height - 1), max(row - depth, 0) - 1, -1):
+            node = self.node_of.get(row * self.width + col)
+            if node is not None:
+                return node
+        return None
+
+    def floor(self, node):
+        """x of the centre and y of the floor of a node's cell."""
+        row, col = divmod(self.cells[node], self.width)
+        return (col + 0.5) * self.cell_width, row * self.cell_height
+
+    def search(self, target, radius):
+        """{node: next node toward target} for the nodes within a path cost of radius."""
+        STATS['searches'] += 1
+        offsets, sources, costs = self.offsets, self.sources, self.costs
+        next_node = {target: target}
+        best = {target: 0}
+        heap = [(0, target)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > best[node]:
+                continue
+            for i in range(offsets[node], offsets[node + 1]):
+                source = sources[i]
+                total = cost + costs[i]
+                if total <= radius and total < best.get(source, radius + 1):
+                    best[source] = total
+                    next_node[source] = node
+                    heapq.heappush(heap, (total, source))
+        return next_node
+
+
+class FlowField:
+    """Next nodes toward the player's node (target), shared by all chasing mobs."""
+
+    def __init__(self, nav, radius, keep=16):
+        self.nav = nav
+        self.radius = radius
+        self.keep = keep
+        self.target = None
+        self.next_node = None
+        # Последние поля по целевому узлу
+        self.fields = OrderedDict()
+
+    def follow(self, x, y):
+        """Move the target to the node of the player standing at (x, y); nothing is searched here."""
+        target = self.nav.node_below(x, y)
+        # В прыжке над пропастью цель остаётся прежней
+        if target is not None and target != self.target:
+            self.target = target
+            self.next_node = None
+
+    def field(self):
+        """{node: next node toward the target}, searched on first use after the target changed."""
+        if self.next_node is None and self.target is not None:
+            field = self.fields.pop(self.target, None)
+            if field is None:
+                field = self.nav.search(self.target, self.radius)
+                if len(self.fields) >= self.keep:
+                    self.fields.popitem(last=False)
+            self.fields[self.target] = field
+            self.next_node = field
+        return self.next_node or {}
+
+    def reset(self):
+        self.target = None
+        self.next_node = None
+
+
+def nav_path(map_path, scaling):
+    name = os.path.splitext(os.path.basename(map_path))[0]
+    return os.path.join(levelcache.CACHE_DIR, f'{name}-{levelcache.source_hash(map_path, scaling)}.nav')
+
+
+def load(map_path, scaling, tile_map, jump_rows, jump_columns, solid=None):
+    """Navigation grid of a map from the cache, built and stored there if it is missing or stale."""
+    path = nav_path(map_path, scaling)
+    if os.path.exists(path):
+        try:
+            grid = NavGrid.read(path)
+        except (ValueError, struct.error):
+            grid = None
+        if grid is not None and (grid.jump_rows, grid.jump_columns) == (jump_rows, jump_columns):
+            STATS['cache_hits'] += 1
+            levelcache.touch(path)
+            return grid
+
+    if solid is None:
+        solid = SolidGrid.create(tile_map, 'objects')
+    grid = NavGrid.build(solid, jump_rows, jump_columns)
+    try:
+        grid.save(path)
+    except OSError:  # каталог кэша недоступен для записи - граф просто строится при каждой загрузке
+        pass
+    levelcache.prune('nav')
+    return grid
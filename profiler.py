@@ -0,0 +1,161 @@
+"""Frame profiler: named timing scopes, rolling percentiles and export.
+
+    with profiler.scope('physics'):
+        physics_engine.update()
+
+    @profiler.timed('animation')
+    def update_animation(self): ...
+
+Time spent in each scope is summed per frame (a scope entered many times
+per frame, e.g. once per entity, gives one total). Nested scopes are
+inclusive: 'simulation' contains 'physics'. begin_frame/end_frame close
+a frame and store its sample.
+
+When ENABLED is False a scope only checks the flag, so the
+instrumentation can stay in the code.
+"""
+import csv
+import json
+import math
+import time
+from collections import deque
+from functools import wraps
+
+
+ENABLED = False
+# Сколько последних кадров используется для перцентилей
+WINDOW = 300
+# Сколько кадров хранится для экспорта
+MAX_SAMPLES = 100000
+
+# Время по областям в текущем кадре
+CURRENT = {}
+# Последние WINDOW кадров для перцентилей и все кадры для экспорта: [{область: секунды}, ...]
+RECENT = deque(maxlen=WINDOW)
+SAMPLES = deque(maxlen=MAX_SAMPLES)
+# Порядок областей в отчёте - порядок первого появления
+NAMES = []
+
+_frame_start = None
+
+
+def enable(enabled=True):
+    global ENABLED
+    ENABLED = enabled
+    if not enabled:
+        CURRENT.clear()
+
+
+def add(name, seconds):
+    if name not in CURRENT:
+        CURRENT[name] = 0.0
+        if name not in NAMES:
+            NAMES.append(name)
+    CURRENT[name] += seconds
+
+
+class Scope:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        if ENABLED:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            add(self.name, time.perf_counter() - self.start)
+            self.start = None
+
+
+_scopes = {}
+
+
+def scope(name):
+    """Context manager timing the block under name (one object per name, so scopes of one name must not nest)."""
+    result = _scopes.get(name)
+    if result is None:
+        result = _scopes[name] = Scope(name)
+    return result
+
+
+def timed(name):
+    """Decorator form of scope()."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                add(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def begin_frame():
+    global _frame_start
+    if ENABLED:
+        _frame_start = time.perf_counter()
+
+
+def end_frame():
+    """Store the sample of the finished frame ('frame' is the time since begin_frame)."""
+    global _frame_start
+    if not ENABLED or _frame_start is None:
+        return
+    add('frame', time.perf_counter() - _frame_start)
+    _frame_start = None
+    sample = dict(CURRENT)
+    CURRENT.clear()
+    RECENT.append(sample)
+    SAMPLES.append(sample)
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def percentiles(name, samples=RECENT):
+    """p50, p95, p99 of a scope over the recent frames, in seconds (frames without the scope count as 0)."""
+    values = sorted(sample.get(name, 0.0) for sample in samples)
+    return percentile(values, 0.50), percentile(values, 0.95), percentile(values, 0.99)
+
+
+def report_lines(samples=RECENT):
+    lines = [f'{"scope":<16}{"p50":>8}{"p95":>8}{"p99":>8}  ms, {len(samples)} frames']
+    for name in NAMES:
+        p50, p95, p99 = percentiles(name, samples)
+        lines.append(f'{name:<16}{p50 * 1000:8.2f}{p95 * 1000:8.2f}{p99 * 1000:8.2f}')
+    return lines
+
+
+def export(path):
+    """Write every stored frame to path: CSV (one row per frame, seconds) if it ends with .csv, otherwise JSON."""
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['index'] + NAMES)
+            for number, sample in enumerate(SAMPLES):
+                writer.writerow([number] + [sample.get(name, 0.0) for name in NAMES])
+    else:
+        with open(path, 'w') as f:
+            json.dump({'scopes': NAMES, 'frames': list(SAMPLES)}, f)
+    return path
+
+
+def reset():
+    CURRENT.clear()
+    RECENT.clear()
+    SAMPLES.clear()
+    NAMES.clear()
@@ -0,0 +1,95 @@
+"""Render passes with a fixed layer order and draw statistics.
+
+A RenderPass draws its sprite lists once each, in the configured order.
+Empty and hidden lists are skipped, and small lists whose sprites are all
+outside the view are culled. The large tile layers are not checked
+sprite by sprite: chunks.py already keeps them close to the view.
+
+STATS holds the counters of the current frame (reset by begin_frame):
+draw calls, sprites submitted, GPU buffer uploads and their size.
+"""
+
+
+# Порядок слоёв мира снизу вверх (раньше moving_objects, mobs, player и wall рисовались второй раз поверх сцены)
+WORLD_LAYERS = ('baground', 'objects', 'artifact', 'portal', 'moving_objects', 'mobs', 'player', 'wall')
+
+# Списки больше этого размера рисуются без проверки попадания в кадр
+CULL_LIMIT = 64
+
+# Флаг изменения и массив данных SpriteList: при отрисовке изменённые массивы заново загружаются в GPU
+BUFFERS = (
+    ('_sprite_pos_angle_changed', '_sprite_pos_angle_data'),
+    ('_sprite_size_changed', '_sprite_size_data'),
+    ('_sprite_color_changed', '_sprite_color_data'),
+    ('_sprite_texture_changed', '_sprite_texture_data'),
+    ('_sprite_index_changed', '_sprite_index_data'),
+)
+
+STATS = {
+    'draw_calls': 0,
+    'sprites': 0,
+    'uploads': 0,
+    'upload_bytes': 0,
+    'skipped': 0,
+    'culled': 0,
+}
+
+
+def begin_frame():
+    for key in STATS:
+        STATS[key] = 0
+
+
+def camera_view(camera):
+    """World box (left, right, bottom, top) seen by a Camera2D."""
+    x, y = camera.position
+    half_width = camera.width / camera.zoom / 2
+    half_height = camera.height / camera.zoom / 2
+    return x - half_width, x + half_width, y - half_height, y + half_height
+
+
+def visible_in(sprite_list, view):
+    """True if any sprite of the list overlaps the view box (left, right, bottom, top)."""
+    left, right, bottom, top = view
+    for sprite in sprite_list:
+        half_width = sprite.width / 2
+        half_height = sprite.height / 2
+        if (sprite.center_x + half_width >= left and sprite.center_x - half_width <= right
+                and sprite.center_y + half_height >= bottom and sprite.center_y - half_height <= top):
+            return True
+    return False
+
+
+def count_uploads(sprite_list):
+    for changed, data in BUFFERS:
+        if getattr(sprite_list, changed, False):
+            STATS['uploads'] += 1
+            buffer = getattr(sprite_list, data)
+            STATS['upload_bytes'] += len(buffer) * buffer.itemsize
+
+
+class RenderPass:
+    def __init__(self, layers):
+        # [(имя, SpriteList), ...] снизу вверх
+        self.layers = list(layers)
+
+    @classmethod
+    def from_scene(cls, scene, order):
+        """Scene layers in the given order; layers missing from order are drawn last."""
+        mapping = scene._name_mapping
+        names = [name for name in order if name in mapping]
+        names += [name for name in mapping if name not in names]
+        return cls((name, mapping[name]) for name in names)
+
+    def draw(self, view=None):
+        for name, sprite_list in self.layers:
+            if not sprite_list.visible or len(sprite_list) == 0:
+                STATS['skipped'] += 1
+                continue
+            if view is not None and len(sprite_list) <= CULL_LIMIT and not visible_in(sprite_list, view):
+                STATS['culled'] += 1
+                continue
+            count_uploads(sprite_list)
+            sprite_list.draw()
+            STATS['draw_calls'] += 1
+            STATS['sprites'] += len(sprite_list)
@@ -0,0 +1,150 @@
+"""Input recording and deterministic replay.
+
+Every player action is stored with the number of the simulation tick it
+was applied before. The simulation has a fixed step and no randomness,
+so feeding the same actions at the same ticks gives the same run.
+Checksums of the world state are stored every CHECKSUM_INTERVAL ticks,
+and the replay reports the first tick where the run differs.
+
+A recording is gzipped JSON: the map, the tick count, the actions as
+[tick, action number] pairs and the checksums.
+
+    python main.py --record session.replay   # play, the file is written on exit
+    python main.py --replay session.replay   # watch it in the window
+    python bench.py replay session.replay    # headless, with a timing report
+"""
+import gzip
+import json
+import time
+import zlib
+
+import profiler
+
+
+# 2 - столкновения со стенами по сетке клеток (gridphysics.py): записи версии 1 в ней расходятся
+# 3 - агрессивные мобы преследуют игрока по графу уровня (navigation.py)
+VERSION = 3
+# 'reset' - перезапуск уровня клавишей R (после смерти уровень перезапускается сам и не записывается)
+ACTIONS = ('left', 'right', 'stop', 'jump', 'attack', 'activate', 'reset')
+CHECKSUM_INTERVAL = 60
+
+
+def checksum(sim):
+    """CRC of the positions and state of everything that moves in the simulation."""
+    # Спящие сущности (lod.py) сначала догоняют текущий тик, иначе сумма зависела бы от положения камеры
+    sim.catch_up()
+    state = [(sprite.position, sprite.change_x, sprite.change_y) for sprite in sim.dynamic_sprites]
+    state.append([mob.alive for mob in sim.mobs])
+    state.append((sim.player.alive, sim.end, len(sim.a_list)))
+    return zlib.crc32(repr(state).encode())
+
+
+class InputRecorder:
+    def __init__(self, map_path):
+        self.map_path = map_path
+        self.tick = 0
+        self.events = []
+        self.checksums = {}
+
+    def record(self, action):
+        self.events.append((self.tick, ACTIONS.index(action)))
+
+    def advance(self, sim):
+        """Call after every simulation tick."""
+        self.tick += 1
+        if self.tick % CHECKSUM_INTERVAL == 0:
+            self.checksums[self.tick] = checksum(sim)
+
+    def save(self, path):
+        data = {
+            'version': VERSION,
+            'map': self.map_path,
+            'ticks': self.tick,
+            'events': self.events,
+            'checksums': self.checksums,
+        }
+        with gzip.open(path, 'wt') as f:
+            json.dump(data, f, separators=(',', ':'))
+        return path
+
+
+class Replay:
+    """Recorded actions, with the same actions(tick) interface as ScriptedInput."""
+
+    def __init__(self, map_path, ticks, events, checksums):
+        self.map_path = map_path
+        self.ticks = ticks
+        self.script = {}
+        for tick, action in events:
+            self.script.setdefault(tick, []).append(ACTIONS[action])
+        self.checksums = checksums
+        self.tick = 0
+        self.desync = None
+
+    @classmethod
+    def load(cls, path):
+        with gzip.open(path, 'rt') as f:
+            data = json.load(f)
+        if data['version'] != VERSION:
+            raise ValueError(f'{path}: replay version {data["version"]}, expected {VERSION}')
+        checksums = {int(tick): value for tick, value in data['checksums'].items()}
+        return cls(data['map'], data['ticks'], data['events'], checksums)
+
+    def actions(self, tick):
+        return self.script.get(tick, ())
+
+    def finished(self):
+        return self.tick >= self.ticks
+
+    def advance(self, sim):
+        """Call after every simulation tick; remembers the first tick whose checksum differs."""
+        self.tick += 1
+        expected = self.checksums.get(self.tick)
+        if expected is not None and self.desync is None and checksum(sim) != expected:
+            self.desync = self.tick
+
+
+def run_headless(path):
+    """Replay a recording without a window. Returns a timing report dict."""
+    import sounds
+    from simulation import Simulation
+
+    sounds.disable()
+    replay = Replay.load(path)
+    sim = Simulation(replay.map_path)
+
+    was_enabled = profiler.ENABLED
+    profiler.reset()
+    profiler.enable()
+    start = time.perf_counter()
+    while not replay.finished():
+        profiler.begin_frame()
+        for action in replay.actions(replay.tick):
+            if action == 'reset':
+                sim.reset()
+            else:
+                sim.apply(action)
+        if 'died' in sim.step():
+            sim.reset()
+        replay.advance(sim)
+        profiler.end_frame()
+    elapsed = time.perf_counter() - start
+    profiler.enable(was_enabled)
+
+    return {
+        'ticks': replay.ticks,
+        'seconds': elapsed,
+        'ticks_per_second': replay.ticks / elapsed if elapsed else 0.0,
+        'desync': replay.desync,
+        'profile': profiler.report_lines(profiler.SAMPLES),
+    }
+
+
+def print_report(report):
+    print(f'{report["ticks"]} ticks in {report["seconds"]:.3f} s ({report["ticks_per_second"]:.1f} ticks/s)')
+    if report['desync'] is None:
+        print('replay matches the recording')
+    else:
+        print(f'replay differs from the recording from tick {report["desync"]}')
+    for line in report['profile']:
+        print('  ' + line)
@@ -2,9 +2,15 @@ WINDOW_TITLE = "The Desert Raven"
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
 
+# Debug overlays (hit boxes, draw statistics, profiler table) and load reports
+DEBUG = False
+MAP_PATH = 'map.json'
+
 # Constants used to scale our sprites from their original size
 CHARACTER_SCALING = 0.055
 TILE_SCALING = 0.4
+# Масштаб мобов, игрока и объектов уровня (Obj.BaseEntity)
+ENTITY_SCALING = 0.4
 COIN_SCALING = 0.5
 SPRITE_PIXEL_SIZE = 223
 GRID_PIXEL_SIZE = SPRITE_PIXEL_SIZE * TILE_SCALING
@@ -14,6 +20,46 @@ PLAYER_MOVEMENT_SPEED = 5
 GRAVITY = 1
 PLAYER_JUMP_SPEED = 20
 
+# Cell size of the collision grid for mobs and their view sensors
+BROADPHASE_CELL_SIZE = 256
+
 # Camera constants
 FOLLOW_DECAY_CONST = 0.3
 # get within 1% of the target position within 2 seconds
+
+# Simulation tick: all movement constants above are per tick of this length
+SIMULATION_RATE = 60
+SIMULATION_DT = 1 / SIMULATION_RATE
+# Max ticks simulated in one frame; after a long stall the rest is dropped
+MAX_SIMULATION_STEPS = 5
+# Render frame rate, independent from the simulation rate
+DRAW_RATE = 60
+
+# Tile layers loaded in chunks around the view (large levels), chunk size in tiles
+STREAMED_LAYERS = ('baground', 'objects')
+CHUNK_TILES = 8
+# Chunks closer than this to the view are loaded, farther than twice this are unloaded
+CHUNK_MARGIN = GRID_PIXEL_SIZE * 4
+
+# Update level of detail (lod.py): entities within the near margin of the view run every tick,
+# within the far margin every LOD_INTERVAL ticks, farther ones sleep
+LOD_NEAR_MARGIN = GRID_PIXEL_SIZE * 6
+LOD_FAR_MARGIN = WINDOW_WIDTH
+LOD_INTERVAL = 4
+LOD_CELL_SIZE = 512
+
+# Столкновения игрока со слоем "objects": 'grid' - по сетке твёрдых клеток (gridphysics.py),
+# 'sprites' - arcade.PhysicsEnginePlatformer по спрайтам тайлов
+PHYSICS = 'grid'
+
+# Движущиеся платформы (kinematics.py): клетка сетки для поиска и отступ от вида, в котором
+# спрайты платформ обновляются каждый тик (больше хода платформы, чтобы скачок догоняющего спрайта был за кадром)
+PLATFORM_CELL_SIZE = GRID_PIXEL_SIZE * 4
+PLATFORM_SYNC_MARGIN = GRID_PIXEL_SIZE * 6
+
+# Погоня агрессивных мобов (navigation.py): прыжок моба в клетках (вверх, в сторону),
+# дальность поля направлений (стоимость пути, шаг по клетке - 1) и сколько последних полей хранить
+NAV_JUMP_ROWS = 2
+NAV_JUMP_COLUMNS = 3
+NAV_FIELD_RADIUS = 48
+NAV_FIELD_CACHE = 16
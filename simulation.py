@@ -0,0 +1,455 @@
+import arcade
+
+from Obj import Player, MovingObject, Mob2, Mob1, Artifact, Portal
+from broadphase import SpatialGrid
+from chunks import ChunkStreamer
+from clock import CLOCK
+from gridphysics import GridPhysicsEngine, SolidGrid
+from kinematics import KinematicBatch
+from lod import UpdateScheduler
+import profiler
+import levelcache
+import navigation
+import systems
+from textures import load_texture
+from settings import *
+from sounds import *
+
+
+class Simulation:
+    """
+    Game world without a window: physics, moving objects, mob AI and collisions.
+
+    GameView renders it, headless runs (benchmarks, CI) drive it directly
+    with step() and a ScriptedInput.
+    """
+
+    def __init__(self, map_path="map.json", lod=True, physics=PHYSICS):
+        self.map_path = map_path
+        self.physics = physics
+        self.tick = 0
+        # Видимая область (left, right, bottom, top), которую задаёт окно; None - вокруг игрока
+        self.view = None
+
+        self.scene = self.create_scene()
+        self.a_list = arcade.SpriteList()
+        # Платформы двигаются одним векторным шагом (если есть NumPy), иначе - своим update().
+        # С GridPhysicsEngine батч сам двигает платформы и пишет в спрайты только нужные (kinematics.py)
+        self.platforms = [obj for obj in self.moving_objects if isinstance(obj, MovingObject)]
+        self.kinematics = KinematicBatch.create(self.platforms, PLATFORM_CELL_SIZE, lazy=self.solid_grid is not None)
+
+        # Our physics engine.
+        if self.solid_grid is not None:
+            # Стены - сетка клеток всего уровня, спрайты тайлов для столкновений не нужны
+            self.physics_engine = GridPhysicsEngine(
+                self.player, self.solid_grid, gravity_constant=GRAVITY, platforms=self.p_lst, bodies=self.kinematics
+            )
+        else:
+            # Слой стен передаётся списком: пустой SpriteList (чанки ещё не загружены) движок иначе пропускает
+            self.physics_engine = arcade.PhysicsEnginePlatformer(
+                self.player, gravity_constant=GRAVITY, walls=[self.scene["objects"]], platforms=self.p_lst
+            )
+        self.end = False
+
+        # Все мобы уровня (убитые пропадают из mobs_spritelist, но нужны для reset) и сетка для поиска столкновений
+        self.mobs = list(self.mobs_spritelist)
+        self.grid = SpatialGrid(BROADPHASE_CELL_SIZE)
+
+        # Мобы, артефакт и портал - сущности ECS (ecs.py), их обновляют системы из systems.py
+        self.world = systems.create_world(
+            self.mobs,
+            [obj for obj in self.moving_objects if isinstance(obj, Artifact)],
+            [obj for obj in self.moving_objects if isinstance(obj, Portal)],
+        )
+        # Далёкие от вида сущности спят, средние обновляются реже (lod.py); lod=False - все каждый тик
+        self.scheduler = None
+        if lod:
+            self.scheduler = UpdateScheduler(self.world, LOD_NEAR_MARGIN, LOD_FAR_MARGIN, LOD_INTERVAL, LOD_CELL_SIZE)
+
+        # Спрайты, которые двигаются каждый тик (игрок, платформы, мобы)
+        self.dynamic_sprites = [self.player] + list(self.p_lst) + list(self.mobs_spritelist)
+        self.previous_positions = [sprite.position for sprite in self.dynamic_sprites]
+
+        self.update_chunks()
+
+        # Начальное состояние уровня - reset возвращает к нему без повторной загрузки
+        self.snapshot = self.save_state()
+
+    def create_scene(self) -> arcade.Scene:
+        """Load the tilemap and create the scene object."""
+        #Загружается карта уровней из файла (по умолчанию map.json) с масштабированием TILE_SCALING.
+        #Для слоя "objects2" включается пространственный хешинг (use_spatial_hash=True), что ускоряет проверку столкновений.
+        layer_options = {
+            "objects2": {
+                "use_spatial_hash": True,
+            },
+        }
+        # Карта читается из скомпилированного кэша (levelcache.py), JSON разбирается только после её изменения
+        tile_map = levelcache.load_tilemap(
+            self.map_path,
+            scaling=TILE_SCALING,
+            layer_options=layer_options,
+            streamed=STREAMED_LAYERS,
+        )
+
+        # Цвет фона и размеры уровня нужны окну для камеры; сама симуляция от окна не зависит
+        self.background_color = tile_map.background_color
+        self.level_width = tile_map.width * GRID_PIXEL_SIZE
+        self.level_height = tile_map.height * GRID_PIXEL_SIZE
+
+        # Our Scene Object
+        # Initialize Scene with our TileMap, this will automatically add all layers
+        # Извлекается слой платформ "objects2" для дополнительной обработки.
+        # Создаётся объект сцены из тайлмапа, автоматически добавляющий все слои как списки спрайтов.
+        platforms = tile_map.object_lists["objects2"]
+        del tile_map.object_lists["objects2"]
+        scene = arcade.Scene.from_tilemap(tile_map)
+        # Твёрдые клетки слоя "objects" для GridPhysicsEngine (строятся до того, как чанки начнут менять слой)
+        self.solid_grid = SolidGrid.create(tile_map, "objects") if self.physics == 'grid' else None
+        # Граф клеток, по которому агрессивные мобы идут к игроку (navigation.py); хранится в кэше рядом с картой.
+        # Твёрдое для него то же, что для физики: объекты "wall" - декорации, сквозь них ходят
+        self.nav = navigation.load(
+            self.map_path, TILE_SCALING, tile_map, NAV_JUMP_ROWS, NAV_JUMP_COLUMNS, solid=self.solid_grid,
+        )
+        self.flow = navigation.FlowField(self.nav, NAV_FIELD_RADIUS, NAV_FIELD_CACHE)
+        # Большие слои тайлов подгружаются кусками вокруг видимой области (для карт, загруженных arcade, - None)
+        self.chunks = ChunkStreamer.create(tile_map, scene, STREAMED_LAYERS, CHUNK_TILES, CHUNK_MARGIN)
+        #Создание движущихся платформ. Для каждого объекта платформы создаётся спрайт. Устанавливаются физические свойства (масса, трение, упругость).
+        #Позиция спрайта рассчитывается по координатам объекта. Создаётся объект MovingObject, который отвечает за движение платформы (например, вверх-вниз).
+        #Платформы добавляются в список движущихся объектов, в сцену и в отдельный список платформ.
+        self.moving_objects = []
+        self.p_lst = arcade.SpriteList()
+        for obj in platforms:
+            sprite = arcade.Sprite(
+                load_texture("assets/sprites/platform.png"),
+                scale=TILE_SCALING
+                )
+
+            # Координаты — можно использовать obj.x и obj.y, или obj.shape
+            x1, y1 = obj.shape[0]
+            x2, y2 = obj.shape[2]  # по диагонали
+
+            sprite.mass = 1.0
+            sprite.friction = 0.5
+            sprite.elasticity = 0.3
+            sprite.center_x = (x1 + x2) / 2 #Центр прямоугольной области
+            sprite.center_y = (y1 + y2) / 2
+
+            # Создаем объект движения (например, вверх-вниз на 100 пикселей, скорость 1)
+            moving_object = MovingObject(
+                sprite=sprite,
+                speed=obj.properties['speed'],
+                direction=[0, obj.properties['direction']],
+                range_=obj.properties['range']  # Дальность движения по Y
+            )
+
+            self.moving_objects.append(moving_object) #Добавляет объект moving_object (обычно это игровой объект с логикой движения, например, движущаяся платформа) в список moving_objects.
+            scene.add_sprite("moving_objects", sprite) #Добавляет спрайт sprite в сцену (scene) в слой с именем "moving_objects".
+            self.p_lst.append(sprite) #Добавляет тот же спрайт sprite в отдельный список спрайтов p_lst, который используется для управления платформами
+
+        #Аналогично платформам, создаются объекты врагов с разным классом в зависимости от направления движения.
+        mobs = tile_map.object_lists['mobs']
+        del tile_map.object_lists['mobs'] #После извлечения этот слой удаляется из объекта тайлмапа, чтобы избежать повторной обработки.
+        # Список мобов - сам слой "mobs" сцены: спрайт в двух списках при каждом шаге обновлял бы оба
+        self.mobs_spritelist = scene.add_sprite_list("mobs")
+        for mob in mobs:
+            x1, y1 = mob.shape[0]
+            x2, y2 = mob.shape[2]
+            x = (x1 + x2) / 2
+            y = (y1 + y2) / 2
+            # Создаем объект движения
+            direction = mob.properties['direction']
+            if direction == 0:
+                mob = Mob2(
+                    x, y,
+                    speed=mob.properties['speed'],
+                    direction=[direction, 0],
+                    range_=mob.properties['range']  # Дальность движения по Y
+                )
+                self.mob2 = mob
+                self.mob2.brain.can_attack = True
+
+            else:
+                mob = Mob1(
+                    x, y,
+                    speed=mob.properties['speed'],
+                    direction=[direction, 0],
+                    range_=mob.properties['range']  # Дальность движения по Y
+                )
+                self.mob1 = mob
+
+            mob.position = (x, y)
+
+            self.moving_objects.append(mob) #Враг добавляется в общий список движущихся объектов self.moving_objects для обновления логики движения.
+            self.mobs_spritelist.append(mob) #Спрайт врага добавляется в слой "mobs" сцены для отрисовки, управления и обработки столкновений.
+
+        artifact = tile_map.object_lists['artifact']
+        del tile_map.object_lists['artifact']
+        for artifact in artifact:
+            x1, y1 = artifact.shape[0]
+            x2, y2 = artifact.shape[2]
+            x = (x1 + x2) / 2
+            y = (y1 + y2) / 2
+            artifact = Artifact(x, y)
+            artifact.position = (x, y)
+
+            self.moving_objects.append(artifact)
+            scene.add_sprite("artifact", artifact)
+            self.artifact = artifact
+
+
+        portal = tile_map.object_lists['portal']
+        del tile_map.object_lists['portal']
+        for portal in portal:
+            x1, y1 = portal.shape[0]
+            x2, y2 = portal.shape[2]
+            x = (x1 + x2) / 2
+            y = (y1 + y2) / 2
+            portal = Portal(x, y)
+            portal.position = (x, y)
+
+            self.moving_objects.append(portal)
+            scene.add_sprite("portal", portal)
+            self.portal = portal
+
+        wall = tile_map.object_lists['wall']
+        del tile_map.object_lists['wall']
+        for wall in wall:
+            if len(wall.shape) > 2:
+                x1, y1 = wall.shape[0]
+                x2, y2 = wall.shape[2]
+                x = (x1 + x2) / 2
+                y = (y1 + y2) / 2
+                wall = arcade.Sprite(load_texture('assets/sprites/stone.png'), center_x=x, center_y=y)
+                scene.add_sprite("wall", wall)
+
+        #Создаётся объект игрока, устанавливается стартовая позиция и добавляется в сцену.
+        self.player_list = arcade.SpriteList()
+        self.player = Player()
+        self.player.position = (180, 180)
+        self.player_list.append(self.player)
+        scene.add_sprite("player", self.player)
+
+        return scene
+
+    def save_state(self):
+        """Record the state of every entity right after the level is loaded."""
+        entities = [self.player] + self.moving_objects
+        return [(entity, entity.save_state()) for entity in entities]
+
+    def reset(self):
+        """Return the world to the snapshot taken after loading."""
+        for entity, state in self.snapshot:
+            entity.restore_state(state)
+        if self.kinematics:
+            self.kinematics.reset()
+        if self.scheduler:
+            self.scheduler.reset()
+        self.flow.reset()
+
+        for attack in list(self.a_list):
+            attack.remove_from_sprite_lists()
+        self.physics_engine.jumps_since_ground = 0
+        if self.solid_grid is not None:
+            self.physics_engine.ride = None
+        self.end = False
+        self.tick = 0
+        self.previous_positions = [sprite.position for sprite in self.dynamic_sprites]
+        self.update_chunks()
+
+    def view_box(self):
+        """The view set by the window, or a window-sized box around the player when headless."""
+        if self.view is not None:
+            return self.view
+        x, y = self.player.position
+        return x - WINDOW_WIDTH / 2, x + WINDOW_WIDTH / 2, y - WINDOW_HEIGHT / 2, y + WINDOW_HEIGHT / 2
+
+    def update_chunks(self):
+        """Stream tile chunks around the view."""
+        if self.chunks is not None:
+            self.chunks.update(*self.view_box())
+
+    def catch_up(self):
+        """Bring sleeping entities and unwritten platform sprites to the current tick (before reading the whole world, e.g. for a checksum)."""
+        systems.catch_up(self.world, self.tick)
+        if self.kinematics:
+            self.kinematics.sync_all()
+
+    def interpolate(self, alpha):
+        """
+        Move dynamic sprites to alpha (0..1) between the previous and current tick.
+
+        Returns the real positions to give back to restore_positions after drawing.
+        """
+        current = [sprite.position for sprite in self.dynamic_sprites]
+        for sprite, (x0, y0), (x1, y1) in zip(self.dynamic_sprites, self.previous_positions, current):
+            if x0 != x1 or y0 != y1:
+                sprite.position = (x0 + (x1 - x0) * alpha, y0 + (y1 - y0) * alpha)
+        return current
+
+    def restore_positions(self, positions):
+        for sprite, position in zip(self.dynamic_sprites, positions):
+            sprite.position = position
+
+    def apply(self, action):
+        """
+        Apply one player action: 'left', 'right', 'stop', 'jump', 'attack', 'activate'.
+
+        Returns True if the action had an effect.
+        """
+        if action == 'jump':
+            if self.physics_engine.can_jump():
+                start_sound('player_jump')
+                self.player.jump()
+                return True
+        elif action == 'attack':
+            attack_collision = self.player.attack()
+            if attack_collision:
+                start_sound('player_attack')
+                self.a_list.append(attack_collision)
+                return True
+        elif action == 'right':
+            self.player.direction[0] = 1
+            start_sound('player_walk', loop=True)
+            return True
+        elif action == 'left':
+            self.player.direction[0] = -1
+            start_sound('player_walk', loop=True)
+            return True
+        elif action == 'stop':
+            self.player.direction[0] = 0
+            stop_sound('player_walk')
+            return True
+        elif action == 'activate':
+            if arcade.check_for_collision(self.player, self.artifact) and not self.mob1.alive:
+                self.artifact.active()
+                self.portal.active()
+                start_sound('artifact_activate')
+                return True
+        return False
+
+    def step(self, delta_time=SIMULATION_DT):
+        """
+        Advance the world by one tick.
+
+        Returns a list of events for the view: 'died' (death animation is over),
+        'hit' (a mob killed the player), 'win' (the player entered the portal).
+        """
+        events = []
+        self.tick += 1
+        CLOCK.advance()
+        # Позиции до шага - окно интерполирует между ними и текущими при отрисовке
+        self.previous_positions = [sprite.position for sprite in self.dynamic_sprites]
+        self.update_chunks()
+
+        # Move the player with the physics engine
+        with profiler.scope('physics'):
+            self.physics_engine.update()
+        #Вызывает метод update() для всех движущихся объектов (платформы, враги, артефакты и т.д.), чтобы они изменяли своё состояние и позицию.
+        with profiler.scope('moving_objects'):
+            if self.kinematics:
+                if self.kinematics.lazy:
+                    # Сдвинул платформы уже физический движок (kinematics.advance)
+                    self.kinematics.turn()
+                    # Спрайты платформ у видимой области должны стоять на месте для отрисовки
+                    left, right, bottom, top = self.view_box()
+                    margin = PLATFORM_SYNC_MARGIN
+                    self.kinematics.sync(left - margin, right + margin, bottom - margin, top + margin)
+                else:
+                    self.kinematics.update()
+            else:
+                for platform in self.platforms:
+                    platform.update()
+            # Цель поля направлений - клетка под игроком; поле ищется, только если за ним кто-то гонится
+            self.flow.follow(self.player.center_x, self.player.bottom)
+            if self.scheduler:
+                awake, animated = self.scheduler.schedule(self.tick, *self.view_box())
+                systems.update(self.world, self.tick, awake, animated, self.flow, self.player.center_x)
+                self.scheduler.track(animated)
+                moved = [row[0] for row in self.world.select(awake, 'patrol')]
+            else:
+                systems.update(self.world, self.tick, flow=self.flow, target_x=self.player.center_x)
+                moved = self.mobs
+
+        #Обновляет состояние игрока. Если метод update() возвращает True (игрок погиб), симуляция сообщает об этом окну.
+        with profiler.scope('player'):
+            if self.player.update():
+                events.append('died')
+
+        with profiler.scope('broadphase'):
+            self.update_broadphase(moved)
+        with profiler.scope('mob_collisions'):
+            self.check_mob_collisions(events)
+
+        #Если игрок касается активного портала, игра отмечается как завершённая (self.end = True).
+        if arcade.check_for_collision(self.player, self.portal) and self.portal.trigger.is_active:
+            if not self.end:
+                events.append('win')
+            self.end = True
+
+        return events
+
+    def check_mob_collisions(self, events):
+        #Если игрок попадает в зону видимости моба (view_collision), а моб ещё не агрессивен и жив, моб становится агрессивным (aggro()), меняет направление, если нужно, и проигрывает звук.
+        #Если игрок сталкивается с мобом, который может атаковать, моб атакует и игрок погибает (kill()).
+        #Точные проверки делаются только для мобов и зон видимости из клеток сетки, которых касается игрок.
+        for mob in self.candidate_mobs(self.player):
+            if mob.view_collision and not mob.brain.is_aggro and mob.alive and mob.view_collision.overlaps(self.player):
+                mob.aggro()
+                patrol = mob.patrol
+                if patrol.direction == -1 and mob.position[0] < self.player.position[0] \
+                        or patrol.direction == 1 and mob.position[0] > self.player.position[0]:
+                    patrol.direction *= -1
+                start_sound('mob1_exposure')
+
+            elif arcade.check_for_collision(self.player, mob) and mob.alive and mob.brain.can_attack:
+                mob.attack()
+                self.player.kill()
+                events.append('hit')
+
+        #Если моб Mob1 сталкивается с атакой игрока из списка a_list, он погибает и проигрывается звук смерти.
+        for attack in self.a_list:
+            for mob in self.grid.query(attack.left, attack.right, attack.bottom, attack.top):
+                if isinstance(mob, Mob1) and not mob.brain.is_aggro and mob.alive and arcade.check_for_collision(mob, attack):
+                    mob.kill()
+                    start_sound('mob1_die')
+
+    def update_broadphase(self, mobs):
+        """Re-bin mobs that moved to other grid cells; a mob's box covers its view sensors too."""
+        grid = self.grid
+        for mob in mobs:
+            if mob.alive:
+                reach = mob.width / 2
+                for sensor in mob.sensors:
+                    reach = max(reach, abs(sensor.offset_x) + sensor.half_width)
+                grid.update_around(mob, mob.center_x, mob.center_y, reach, mob.height / 2)
+            elif mob in grid:
+                grid.remove(mob)
+
+    def candidate_mobs(self, sprite):
+        """Mobs whose body or view sensor may overlap the sprite."""
+        return self.grid.query(sprite.left, sprite.right, sprite.bottom, sprite.top)
+
+    def run(self, ticks, inputs=None):
+        """Run a number of ticks feeding actions from a ScriptedInput (each tick is a profiler frame)."""
+        for _ in range(ticks):
+            profiler.begin_frame()
+            if inputs:
+                for action in inputs.actions(self.tick):
+                    self.apply(action)
+            if 'died' in self.step():
+                self.reset()
+            profiler.end_frame()
+
+
+class ScriptedInput:
+    """Player actions by tick number: {tick: [action, ...]}, optionally repeated."""
+
+    def __init__(self, script, loop=0):
+        self.script = script
+        self.loop = loop
+
+    def actions(self, tick):
+        if self.loop:
+            tick %= self.loop
+        return self.script.get(tick, ())
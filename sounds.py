@@ -1,3 +1,14 @@
+"""Sound effects and music.
+
+Sounds are decoded on first use and kept in an LRU cache with a cap on
+the decoded (PCM) size. Playbacks go through a small voice pool: when it
+is full a new sound takes the voice of a less important one or is
+skipped. The same sound started several times in one frame is played
+once.
+"""
+import time
+from collections import OrderedDict
+
 import arcade
 
 
@@ -17,27 +28,183 @@ SOUNDS = {
     'player_jump': 'assets/sounds/sound_jump.mp3',  # !
 }
 
+# Чем больше, тем важнее звук: при нехватке голосов он вытесняет менее важные
+PRIORITIES = {
+    'background_sound': 10,
+    'win': 9,
+    'artifact_activate': 8,
+    'mob1_die': 6,
+    'mob1_exposure': 5,
+    'mob1_attack': 4,
+    'mob2_attack': 4,
+    'player_attack': 3,
+    'player_jump': 3,
+    'mob1_run': 2,
+    'player_walk': 1,
+}
+DEFAULT_PRIORITY = 0
+
+# Ограничение на декодированные (PCM) звуки в памяти, байт
+CACHE_LIMIT = 64 * 1024 * 1024
+# Одновременно звучащих звуков
+MAX_VOICES = 8
+
+# имя -> Sound, в порядке последнего использования
+LOADED_SOUNDS = OrderedDict()
+SOUND_SIZES = {}
+
+# имя -> player последнего запуска этого звука
 ACTIVE_SOUNDS = {
 
 }
+# Все звучащие голоса: [(имя, player, приоритет), ...] от старых к новым
+VOICES = []
+
+# Звуки, запущенные в текущем кадре (повторный запуск в том же кадре игнорируется)
+STARTED_THIS_FRAME = {}
+
+STATS = {
+    'decodes': 0,
+    'decode_time': 0.0,
+    'evictions': 0,
+    'played': 0,
+    'deduplicated': 0,
+    'stolen': 0,
+    'dropped': 0,
+    'peak_voices': 0,
+}
+
+# False - звук выключен (headless-симуляция, CI без аудиоустройства)
+ENABLED = True
+
+
+def disable():
+    global ENABLED
+    ENABLED = False
+
+
+def pcm_size(sound):
+    """Approximate size of a decoded sound in bytes."""
+    source = sound.source
+    audio_format = source.audio_format
+    if audio_format is None or not source.duration:
+        return 0
+    return int(source.duration * audio_format.bytes_per_second)
+
 
-for name, path in SOUNDS.items():
-    SOUNDS[name] = arcade.load_sound(path)
+def add_sound(name, sound, decode_time=0.0):
+    """Put a decoded sound into the cache (used by get_sound and the asset loader)."""
+    STATS['decodes'] += 1
+    STATS['decode_time'] += decode_time
+    LOADED_SOUNDS[name] = sound
+    LOADED_SOUNDS.move_to_end(name)
+    SOUND_SIZES[name] = pcm_size(sound)
+    evict()
+    return sound
 
 
-def stop_all_sounds():
-    for sound, player in ACTIVE_SOUNDS.items():
-        sound.stop(player)
+def evict():
+    """Drop the least recently used sounds that are not playing until the cache fits CACHE_LIMIT."""
+    playing = {voice[0] for voice in VOICES}
+    for name in list(LOADED_SOUNDS):
+        if cache_size() <= CACHE_LIMIT:
+            break
+        if name in playing:
+            continue
+        del LOADED_SOUNDS[name]
+        del SOUND_SIZES[name]
+        STATS['evictions'] += 1
+
+
+def cache_size():
+    return sum(SOUND_SIZES.values())
+
+
+def get_sound(name):
+    # Звук декодируется при первом использовании, а не при импорте модуля
+    sound = LOADED_SOUNDS.get(name)
+    if sound is None:
+        start = time.perf_counter()
+        sound = arcade.load_sound(SOUNDS[name])
+        return add_sound(name, sound, time.perf_counter() - start)
+    LOADED_SOUNDS.move_to_end(name)
+    return sound
+
+
+def new_frame():
+    """Call once per frame: forgets the sounds started in the previous one and frees finished voices."""
+    STARTED_THIS_FRAME.clear()
+    prune_voices()
+
+
+def prune_voices():
+    VOICES[:] = [voice for voice in VOICES if voice[1].playing]
+    for name, player in list(ACTIVE_SOUNDS.items()):
+        if not player.playing:
+            del ACTIVE_SOUNDS[name]
+
+
+def _release(voice):
+    name, player, priority = voice
+    VOICES.remove(voice)
+    LOADED_SOUNDS[name].stop(player)
+    if ACTIVE_SOUNDS.get(name) is player:
+        del ACTIVE_SOUNDS[name]
+
+
+def stop_all_sounds(keep=()):
+    for voice in list(VOICES):
+        if voice[0] not in keep:
+            _release(voice)
 
 
 def start_sound(name, **kw):
-    if ACTIVE_SOUNDS.get(SOUNDS[name]):
+    if not ENABLED:
+        return None
+    if name in STARTED_THIS_FRAME:
+        STATS['deduplicated'] += 1
+        return STARTED_THIS_FRAME[name]
+
+    player = ACTIVE_SOUNDS.get(name)
+    if player is not None and kw.get('loop') and player.playing:
+        # Зацикленный звук уже звучит - не перезапускаем его (шаги при каждом нажатии клавиши)
+        return player
+    if player is not None:
         stop_sound(name)
-    ACTIVE_SOUNDS[SOUNDS[name]] = SOUNDS[name].play(**kw)
-    return ACTIVE_SOUNDS[SOUNDS[name]]
+
+    priority = PRIORITIES.get(name, DEFAULT_PRIORITY)
+    if len(VOICES) >= MAX_VOICES:
+        prune_voices()
+    if len(VOICES) >= MAX_VOICES:
+        # Голос забирается у самого старого из наименее важных звуков
+        victim = min(VOICES, key=lambda voice: voice[2])
+        if victim[2] > priority:
+            STATS['dropped'] += 1
+            return None
+        _release(victim)
+        STATS['stolen'] += 1
+
+    player = get_sound(name).play(**kw)
+    VOICES.append((name, player, priority))
+    ACTIVE_SOUNDS[name] = player
+    STARTED_THIS_FRAME[name] = player
+    STATS['played'] += 1
+    STATS['peak_voices'] = max(STATS['peak_voices'], len(VOICES))
+    return player
 
 
 def stop_sound(name):
-    SOUNDS[name].stop(ACTIVE_SOUNDS[SOUNDS[name]])
+    for voice in list(VOICES):
+        if voice[0] == name:
+            _release(voice)
+    ACTIVE_SOUNDS.pop(name, None)
 
 
+def report():
+    """Decode time, cache residency and voice usage."""
+    return dict(
+        STATS,
+        cached=len(LOADED_SOUNDS),
+        cache_bytes=cache_size(),
+        active_voices=len(VOICES),
+    )
@@ -0,0 +1,37 @@
+"""Startup timing marks.
+
+Seconds since the process started, recorded once per mark:
+
+    window       the window is open
+    first_frame  the loading screen has drawn its first frame
+    interactive  the first frame of the game has been drawn
+
+The process start is taken from STARTUP_T0 (set by bench.py startup just
+before it launches the game) or else is the moment this module, the
+first one main.py imports, was imported.
+
+    python main.py --startup-report   # prints the marks as JSON and exits
+"""
+import json
+import os
+import sys
+import time
+
+
+T0 = float(os.environ.get('STARTUP_T0') or time.time())
+MARKS = {}
+# True - после первого кадра игры отметки печатаются и игра закрывается
+REPORT = False
+
+
+def mark(name):
+    """Record the mark the first time it is reached. Returns True if it was recorded now."""
+    if name in MARKS:
+        return False
+    MARKS[name] = time.time() - T0
+    return True
+
+
+def print_report():
+    print(json.dumps(MARKS))
+    sys.stdout.flush()
@@ -0,0 +1,239 @@
+"""Per-tick systems over the entities of ecs.World.
+
+Simulation.step runs them in this order: chase (aggro mobs follow the
+player's flow field), patrol (the other mobs walk), sensors (view areas
+turn with the mob), animation (frames advance, finished animations
+trigger their ANIMATION_END handler). The player is not an
+entity: it is driven by the physics engine and its own update().
+
+Each system takes the rows it should process, so the update scheduler
+(lod.py) can leave out the entities that sleep this tick.
+"""
+import math
+
+import arcade
+
+import profiler
+from clock import CLOCK
+from ecs import World
+from sounds import start_sound
+
+
+def end_attack(mob):
+    mob.brain.is_attack = False
+
+
+def end_die(mob):
+    # Убитый моб пропадает из списков спрайтов, reset возвращает его обратно
+    arcade.Sprite.kill(mob)
+
+
+def end_exposure(mob):
+    mob.brain.can_attack = True
+    start_sound('mob1_run', loop=True)
+
+
+def end_active(artifact):
+    artifact.now_texture = artifact.missing_texture
+
+
+# Что происходит, когда закончилась анимация с этим именем (Animation.name), по видам сущностей
+MOB_ANIMATION_END = {
+    'attack': end_attack,
+    'die': end_die,
+    'exposure': end_exposure,
+}
+ARTIFACT_ANIMATION_END = {
+    'active': end_active,
+}
+PORTAL_ANIMATION_END = {}
+
+
+def create_world(mobs, artifacts, portals):
+    world = World()
+    for mob in mobs:
+        components = dict(patrol=mob.patrol, brain=mob.brain, animation=MOB_ANIMATION_END)
+        if mob.view_collision:
+            components['sensor'] = mob.view_collision
+            components['chase'] = mob.chase
+        world.create(mob, **components)
+    for artifact in artifacts:
+        world.create(artifact, trigger=artifact.trigger, animation=ARTIFACT_ANIMATION_END)
+    for portal in portals:
+        world.create(portal, trigger=portal.trigger, animation=PORTAL_ANIMATION_END)
+    return world
+
+
+def chase_system(rows, tick, flow, target_x):
+    """
+    Aggro mobs go to the player along the navigation grid; rows are (mob, patrol, brain, chase).
+
+    Each mob steps toward the next node of the shared flow field (navigation.FlowField), and
+    within the player's node toward target_x. Up a jump link it rises first and then moves over,
+    down a drop it moves over first. A mob that is out of the field's reach stands still.
+    The mobs handled here are taken out of patrol_system for this tick (patrol.tick).
+    """
+    nav = flow.nav
+    field = None
+    for mob, patrol, brain, chase in rows:
+        if not (brain.is_aggro and brain.can_attack and mob.alive) or mob.now_texture.stagger:
+            continue
+        patrol.tick = tick
+        if field is None:
+            field = flow.field()
+        x, y = mob.center_x, mob.center_y
+
+        if chase.offset_y is None:
+            chase.node = nav.node_below(x, y)
+            if chase.node is None:
+                mob.change_x = 0
+                continue
+            chase.offset_y = y - nav.floor(chase.node)[1]
+        col = math.floor(x / nav.cell_width)
+        row = (y - chase.offset_y) / nav.cell_height
+        node = None
+        if 0 <= col < nav.width and abs(row - round(row)) < 1e-6:
+            node = nav.node_of.get(round(row) * nav.width + col)
+        # Между клетками (в прыжке или падении) моб держится последнего узла
+        if node is None:
+            node = chase.node
+        chase.node = node
+
+        next_node = field.get(node)
+        if next_node is None:
+            mob.change_x = 0
+            continue
+        goal_x, goal_y = nav.floor(next_node)
+        goal_y += chase.offset_y
+        if next_node == node:
+            goal_x = target_x
+
+        speed = abs(patrol.speed)
+        dx = 0
+        if goal_y > y:
+            y = min(goal_y, y + speed)
+        elif x != goal_x:
+            dx = max(-speed, min(speed, goal_x - x))
+            x += dx
+        elif goal_y != y:
+            y = max(goal_y, y - speed)
+        mob.change_x = dx
+        if dx:
+            patrol.direction = 1 if dx > 0 else -1
+        if mob.center_x != x or mob.center_y != y:
+            mob.position = (x, y)
+
+
+def patrol_system(rows, tick):
+    """
+    Mobs walk between start_x - range and start_x + range; a mob in a staggering animation stands still.
+
+    rows are (mob, patrol). A mob skipped for some ticks makes all the steps it missed,
+    so it ends up where it would have been if it had been updated every tick.
+    """
+    for mob, patrol in rows:
+        steps = tick - patrol.tick
+        patrol.tick = tick
+        if steps <= 0 or not mob.alive or mob.now_texture.stagger:
+            continue
+        direction = patrol.direction
+        if steps > 1:
+            walk(mob, patrol, steps)
+            continue
+        if direction:
+            x = mob.center_x
+            # Меняем направление, если вышли за пределы движения по X
+            if abs(x - patrol.start_x) >= patrol.range:
+                direction = patrol.direction = -direction
+            change_x = mob.change_x = patrol.speed * direction
+        else:
+            change_x = mob.change_x
+            if not change_x:
+                continue
+            x = mob.center_x
+        mob.center_x = x + change_x
+
+
+def walk(mob, patrol, steps):
+    """Several patrol steps at once; the sprite is written only at the end."""
+    x = mob.center_x
+    change_x = mob.change_x
+    direction = patrol.direction
+    start_x = patrol.start_x
+    range_ = patrol.range
+    speed = patrol.speed
+    for _ in range(steps):
+        if direction:
+            if abs(x - start_x) >= range_:
+                direction = -direction
+            change_x = speed * direction
+        x += change_x
+    patrol.direction = direction
+    if direction:
+        mob.change_x = change_x
+    if x != mob.center_x:
+        mob.center_x = x
+
+
+def sensor_system(rows):
+    """View areas look the way the mob walks; rows are (mob, patrol, sensor)."""
+    for mob, patrol, sensor in rows:
+        sensor.direction = -1 if patrol.direction == -1 else 1
+
+
+def animation_system(rows):
+    """
+    Choose each entity's animation and show its frame at the clock tick; rows are (entity, on_end).
+
+    Positions come from the global clock, so an entity whose animation, direction
+    and frame stay the same is not touched beyond its change_anim(); textures are
+    only assigned on the ticks where the frame changes (next_frame_tick).
+    """
+    tick = CLOCK.tick
+    with profiler.scope('animation'):
+        for entity, on_end in rows:
+            # Поворот в сторону движения
+            change_x = entity.change_x
+            if change_x < 0 and entity.character_face_direction == 0:
+                entity.character_face_direction = 1
+                entity.animation_dirty = True
+            elif change_x > 0 and entity.character_face_direction == 1:
+                entity.character_face_direction = 0
+                entity.animation_dirty = True
+
+            entity.change_anim()
+
+            if entity.animation_dirty or tick >= entity.next_frame_tick:
+                name = entity.advance_animation(tick)
+                if name is not None:
+                    handler = on_end.get(name)
+                    if handler is not None:
+                        handler(entity)
+            else:
+                entity.animated_tick = tick
+
+
+def update(world, tick, awake=None, animated=None, flow=None, target_x=0):
+    """
+    Run the systems for one tick.
+
+    awake and animated are the entities whose AI and animation run this tick
+    (UpdateScheduler.schedule); None - every entity. flow is the flow field to the
+    player at target_x (navigation.FlowField); None - mobs only patrol.
+    """
+    if flow is not None:
+        names = ('patrol', 'brain', 'chase')
+        chase_system(world.view(*names) if awake is None else world.select(awake, *names), tick, flow, target_x)
+    if awake is None:
+        patrol_system(world.view('patrol'), tick)
+        sensor_system(world.view('patrol', 'sensor'))
+    else:
+        patrol_system(world.select(awake, 'patrol'), tick)
+        sensor_system(world.select(awake, 'patrol', 'sensor'))
+    animation_system(world.view('animation') if animated is None else world.select(animated, 'animation'))
+
+
+def catch_up(world, tick):
+    """Bring the patrols of every entity, sleeping ones too, to tick."""
+    patrol_system(world.view('patrol'), tick)
+    sensor_system(world.view('patrol', 'sensor'))
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+
+import arcade
+from arcade.texture import ImageData
+from PIL import Image
+
+from settings import ENTITY_SCALING
+
+
+# Кэш текстур на весь процесс: кадр и его зеркальная копия декодируются один раз,
+# а сущности (и каждый reset уровня) получают уже готовые пары.
+FRAMES = {
+
+}
+
+ANIMATIONS = {
+
+}
+
+# Текстура кадра -> точки её хитбокса в масштабе сущностей, одни на всех мобов с этим кадром
+HIT_BOXES = {
+
+}
+
+# Упакованный атлас (python atlas.py): путь кадра -> область на странице, хэш и хитбокс
+ATLAS_MANIFEST = 'assets/atlas/manifest.json'
+ATLAS = {
+
+}
+ATLAS_PAGES = {
+
+}
+_atlas_lock = threading.Lock()
+
+STATS = {
+    'frame_hits': 0,
+    'frame_misses': 0,
+    'animation_hits': 0,
+    'animation_misses': 0,
+    'file_decodes': 0,
+    'atlas_slices': 0,
+    'atlas_stale': 0,
+}
+
+
+def source_stamp(path):
+    """Size and modification time of a source image, as recorded in the atlas manifest."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _packed_source_unchanged(path, frame):
+    try:
+        return frame.get('source') == source_stamp(path)
+    except OSError:  # исходника нет - кадр есть только в атласе
+        return True
+
+
+def load_atlas(path=ATLAS_MANIFEST):
+    """Read the atlas manifest if it was built; returns True if frames can come from it."""
+    with _atlas_lock:
+        if not ATLAS and os.path.exists(path):
+            with open(path) as f:
+                manifest = json.load(f)
+            # Кадры, исходный файл которых изменился после упаковки, читаются из самого файла
+            frames = manifest['frames']
+            stale = [frame_path for frame_path, frame in frames.items() if not _packed_source_unchanged(frame_path, frame)]
+            for frame_path in stale:
+                del frames[frame_path]
+            STATS['atlas_stale'] = len(stale)
+            if stale:
+                print(f'atlas: {len(stale)} frames changed since packing, rebuild it with python atlas.py')
+            ATLAS.update(manifest)
+    return bool(ATLAS)
+
+
+def _atlas_page(index):
+    with _atlas_lock:
+        page = ATLAS_PAGES.get(index)
+        if page is None:
+            page = Image.open(ATLAS['pages'][index])
+            page.load()
+            ATLAS_PAGES[index] = page
+    return page
+
+
+def decode_frame(path):
+    """Read and decode an image file. Does not touch OpenGL, safe to call from a worker thread."""
+    frame = ATLAS['frames'].get(path) if load_atlas() else None
+    if frame is None:
+        STATS['file_decodes'] += 1
+        return arcade.load_texture(path)
+
+    # Кадр вырезается из уже декодированной страницы; хэш и хитбокс посчитаны при упаковке
+    STATS['atlas_slices'] += 1
+    x, y = frame['x'], frame['y']
+    image = _atlas_page(frame['page']).crop((x, y, x + frame['w'], y + frame['h']))
+    texture = arcade.Texture(
+        ImageData(image, hash=frame['hash']),
+        hit_box_points=[tuple(point) for point in frame['hit_box']],
+    )
+    texture.file_path = path
+    return texture
+
+
+def unload_atlas_pages():
+    """Drop decoded atlas pages once every frame has been sliced."""
+    ATLAS_PAGES.clear()
+
+
+def add_frame(path, texture, reverse=False, upscale=1):
+    """Store a decoded texture in the cache as a (right, left) pair and return the pair."""
+    key = (path, reverse, upscale)
+    if key in FRAMES:
+        return FRAMES[key]
+
+    texture.size = (texture.size[0]*upscale, texture.size[1]*upscale)
+
+    if reverse:
+        pair = (texture.flip_left_right(), texture)
+    else:
+        pair = (texture, texture.flip_left_right())
+
+    for frame in pair:
+        HIT_BOXES[frame] = tuple((x * ENTITY_SCALING, y * ENTITY_SCALING) for x, y in frame.hit_box_points)
+    FRAMES[key] = pair
+    return pair
+
+
+def load_frame(path, reverse=False, upscale=1):
+    """Return the (right, left) texture pair for a single image file."""
+    pair = FRAMES.get((path, reverse, upscale))
+    if pair is not None:
+        STATS['frame_hits'] += 1
+        return pair
+
+    STATS['frame_misses'] += 1
+    return add_frame(path, decode_frame(path), reverse, upscale)
+
+
+def load_texture(path):
+    """Cached replacement for arcade.load_texture (for sprites built from a single image)."""
+    return load_frame(path)[0]
+
+
+def load_animation(filepath, length, reverse=False, upscale=1):
+    """Return the shared tuple of texture pairs for an animation."""
+    key = (filepath, length, reverse, upscale)
+    textures = ANIMATIONS.get(key)
+    if textures is not None:
+        STATS['animation_hits'] += 1
+        return textures
+
+    STATS['animation_misses'] += 1
+    textures = tuple(
+        load_frame(path, reverse, upscale)
+        for path in frame_paths(filepath, length)
+    )
+    ANIMATIONS[key] = textures
+    return textures
+
+
+def frame_paths(filepath, length):
+    return [filepath.format(i) for i in range(1, length + 1)]
+
+
+def reset_stats():
+    for name in STATS:
+        STATS[name] = 0
+
+
+def clear_cache():
+    FRAMES.clear()
+    ANIMATIONS.clear()
+    HIT_BOXES.clear()
+    ATLAS.clear()
+    ATLAS_PAGES.clear()
+    reset_stats()
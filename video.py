@@ -0,0 +1,166 @@
+"""Streaming playback of the end cutscene.
+
+Frames are decoded by a worker thread a few frames ahead of the playhead
+into a small ring buffer and dropped after they were shown, so memory
+stays bounded whatever the clip length and nothing is decoded at
+startup. VideoStream can be used wherever an Animation is expected.
+
+Sources:
+    * an image sequence pattern: 'assets/sprites/video/video ({}).jpg' + length
+    * a single multi-frame file (GIF, WebP, APNG, multi-page TIFF)
+"""
+import threading
+from collections import deque
+
+import arcade
+from arcade.texture import ImageData
+from PIL import Image, ImageSequence
+
+
+class VideoStream:
+    def __init__(self, filepath, length=None, speed=5, stop=False, name=None, upscale=1, buffer=4):
+        self.filepath = filepath
+        self.speed = speed
+        self.stop = stop
+        self.stagger = False
+        self.name = name
+        self.upscale = upscale
+        self.buffer_size = buffer
+        self.length = length if length is not None else self._container_length()
+
+        self.index = 0
+        self.frame_index = -1
+        self.current = None
+        self.poster = None
+        # Видео идёт по своему счётчику, а не по часам анимаций: кадр может смениться каждый тик
+        self.next_change = 0
+
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.generation = 0
+        self.thread = None
+        # Исключение, на котором упал декодер текущего поколения
+        self.error = None
+
+    def _container_length(self):
+        with Image.open(self.filepath) as image:
+            return getattr(image, 'n_frames', 1)
+
+    def _images(self, start):
+        """Decoded PIL images starting at frame number start."""
+        if '{}' in self.filepath:
+            for i in range(start, self.length):
+                yield Image.open(self.filepath.format(i + 1))
+        else:
+            with Image.open(self.filepath) as container:
+                for i, image in enumerate(ImageSequence.Iterator(container)):
+                    if i >= start:
+                        yield image.copy()
+
+    def _make_texture(self, image):
+        # Текстура создаётся в потоке декодера - это не трогает OpenGL
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+        texture = arcade.Texture(ImageData(image), hit_box_points=_box(image.size))
+        texture.size = (texture.size[0] * self.upscale, texture.size[1] * self.upscale)
+        return texture
+
+    def _decode(self, generation, start):
+        try:
+            images = self._images(start)
+            number = start
+            for image in images:
+                texture = self._make_texture(image)
+                with self.condition:
+                    while len(self.buffer) >= self.buffer_size and self.generation == generation:
+                        self.condition.wait()
+                    if self.generation != generation:
+                        return
+                    self.buffer.append((number, texture))
+                    self.condition.notify_all()
+                number += 1
+        except Exception as error:  # нет файла кадра, ошибка PIL - основной поток узнает о ней на следующем кадре
+            with self.condition:
+                if self.generation == generation:
+                    self.error = error
+
+    def start(self):
+        """Start decoding ahead of the playhead (called automatically on first update)."""
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._decode, args=(self.generation, 0), daemon=True, name='video-decoder',
+            )
+            self.thread.start()
+
+    def _next_texture(self, number):
+        """Newest decoded frame up to number, or None if the decoder has not got to it yet; never waits."""
+        self.start()
+        with self.condition:
+            texture = None
+            # Отставшие кадры пропускаются: показывается самый свежий из готовых
+            while self.buffer and self.buffer[0][0] <= number:
+                _, texture = self.buffer.popleft()
+            if texture is not None:
+                self.condition.notify_all()
+            elif self.error is not None:
+                raise self.error
+            return texture
+
+    def frame(self, number):
+        """Texture pair of a frame; only the first one is kept (shown before playback)."""
+        if number == 0:
+            if self.poster is None:
+                texture = self._make_texture(next(self._images(0)))
+                self.poster = (texture, texture)
+            return self.poster
+        return self.current
+
+    def update(self, tick=None):
+        self.index += 1
+        if self.index >= self.length * self.speed:
+            self.index = 0
+            if self.stop:
+                self()
+                return None
+
+        number = self.index // self.speed
+        if number != self.frame_index:
+            # Предыдущий кадр больше нигде не хранится и освобождается сборщиком мусора (и из атласа)
+            texture = self._next_texture(number)
+            if texture is not None:
+                self.frame_index = number
+                # Видео не зеркалится: для обоих направлений одна текстура
+                self.current = (texture, texture)
+            elif self.current is None:
+                self.current = self.frame(0)
+            # Иначе декодер не успел (или ролик кончился) - остаётся прежний кадр, следующий тик спросит снова
+        return self.current
+
+    def __getitem__(self, key):
+        return self.current
+
+    def pause(self, tick):
+        pass
+
+    def resume(self):
+        pass
+
+    def __call__(self):
+        """Rewind: drop buffered frames and restart the decoder from the beginning."""
+        self.index = 0
+        self.frame_index = -1
+        self.current = None
+        with self.condition:
+            self.generation += 1
+            self.buffer.clear()
+            self.error = None
+            self.condition.notify_all()
+        self.thread = None
+
+
+def _box(size):
+    width, height = size
+    return (
+        (-width / 2, -height / 2), (width / 2, -height / 2),
+        (width / 2, height / 2), (-width / 2, height / 2),
+    )